@@ -0,0 +1,253 @@
+"Autoplayer that searches every placement of the active block and scores the resulting boards"
+import copy
+import os
+
+from engine import Board, TetrisEngine
+
+
+def popcount(n):
+    return bin(n).count("1")
+
+
+def placements(grid, block):
+    """
+    placements (grid, block): returns (rotation, x, y) for every place block can rest after turning and sliding above the grid and dropping\n
+    grid  : a Board\n
+    rotations with the same shape (like the flat and upside down I) are only listed once
+    """
+    out = []
+    seen = set()
+    for rotation in range(4):
+        state = block.states[rotation]
+        if state.masks in seen:
+            continue
+        seen.add(state.masks)
+
+        masks = state.masks
+        w,h = state.size
+        for x in range(grid.width - w + 1):
+            if not grid.fits(masks, x, -h):
+                continue
+            out.append((rotation, x, grid.landing(state, x, -h)))
+    return out
+
+
+def afterPlacement(grid, masks, x, y):
+    """
+    afterPlacement (grid, masks, x, y): returns (rows, lines cleared) of grid with the piece locked and full rows removed,
+    or None if the piece would top out
+    """
+    rows = list(grid.rows)
+    for i in range(len(masks)):
+        if masks[i]:
+            r = y + i
+            if r <= 0:
+                return None
+            rows[r] |= masks[i] << x
+
+    kept = [r for r in rows if r != grid.full]
+    lines = grid.height - len(kept)
+    if lines:
+        rows = [0]*lines + kept
+    return rows, lines
+
+
+def boardFeatures(rows, width, height):
+    """
+    boardFeatures (rows, width, height): returns (aggregate height, holes, bumpiness) of a board given as row masks\n
+    a hole is an empty cell with a filled cell somewhere above it in the same column
+    """
+    heights = [0]*width
+    covered = 0
+    holes = 0
+    for y in range(height):
+        row = rows[y]
+        new = row & ~covered
+        while new:
+            low = new & -new
+            heights[low.bit_length()-1] = height - y
+            new ^= low
+        holes += popcount(covered & ~row)
+        covered |= row
+
+    bump = 0
+    for i in range(width-1):
+        bump += abs(heights[i] - heights[i+1])
+    return sum(heights), holes, bump
+
+
+class Heuristic (object):
+    """
+    Heuristic (height, lines, holes, bumpiness): weights for scoring a board after a placement, higher is better\n
+    height    : weight of the summed column heights\n
+    lines     : weight of the rows cleared by the placement\n
+    holes     : weight of the covered empty cells\n
+    bumpiness : weight of the summed height differences between neighbouring columns
+    """
+    def __init__(self, height=-0.510066, lines=0.760666, holes=-0.35663, bumpiness=-0.184483):
+        self.height = height
+        self.lines = lines
+        self.holes = holes
+        self.bumpiness = bumpiness
+
+    def score(self, rows, width, height, lines):
+        h, holes, bump = boardFeatures(rows, width, height)
+        return self.height*h + self.lines*lines + self.holes*holes + self.bumpiness*bump
+
+
+class AutoPlayer (object):
+    """
+    AutoPlayer (engine, heuristic, lookahead): plays a TetrisEngine through the same actions as the keyboard\n
+    heuristic : a Heuristic, the default weights if None\n
+    lookahead : also try every placement of the next block when choosing where the active one goes
+    """
+    def __init__(self, engine, heuristic=None, lookahead=True):
+        self.engine = engine
+        self.heuristic = heuristic or Heuristic()
+        self.lookahead = lookahead
+        self.block = None
+
+    def best(self, grid, block, nextBlock=None):
+        """
+        best (grid, block, nextBlock): returns (value, rotation, x) of the best placement of block, None if every placement tops out
+        """
+        best = None
+        for rotation, x, y in placements(grid, block):
+            after = afterPlacement(grid, block.states[rotation].masks, x, y)
+            if after is None:
+                continue
+            rows, lines = after
+
+            if nextBlock is None:
+                value = self.heuristic.score(rows, grid.width, grid.height, lines)
+            else:
+                board = Board(grid.width, grid.height)
+                board.setRows(rows)
+                follow = self.best(board, nextBlock)
+                if follow is None:
+                    continue
+                #the lines of the first placement count too, they are gone from the board the next one is scored on
+                value = follow[0] + self.heuristic.lines*lines
+
+            if best is None or value > best[0]:
+                best = (value, rotation, x)
+        return best
+
+    def plan(self):
+        """
+        plan (): returns (rotation, x) where the active block should go
+        """
+        engine = self.engine
+        nextBlock = engine.nextBlock if self.lookahead else None
+        best = self.best(engine.grid, engine.block, nextBlock)
+        if best is None and nextBlock is not None:
+            best = self.best(engine.grid, engine.block)
+        if best is None:
+            return engine.block.rotation, engine.block.pos[0]
+        return best[1], best[2]
+
+    def actions(self):
+        """
+        actions (): returns the actions that take a newly spawned block to its planned place and drop it,
+        and nothing for the rest of that block's life\n
+        all of them can be handed to a single TetrisEngine.step, ask on every step so a block that spawns
+        and lands within one frame is still placed
+        """
+        engine = self.engine
+        if engine.block is self.block:
+            return []
+        self.block = engine.block
+
+        rotation, x = self.plan()
+        return pathTo(engine.grid, engine.block, rotation, x)
+
+
+def pathTo(grid, block, rotation, x):
+    """
+    pathTo (grid, block, rotation, x): returns the actions that turn block to rotation, slide it to column x and drop it\n
+    moves that are blocked on the way are left out, the block then drops from wherever it got to
+    """
+    #walk a copy of the block along the moves so blocked moves and kicks are accounted for
+    probe = copy.copy(block)
+    probe.pos = list(probe.pos)
+
+    out = []
+    for i in range(4):
+        if probe.rotation == rotation or not probe.rotate(grid):
+            break
+        out.append("rotate")
+
+    while probe.pos[0] != x:
+        dx = 1 if x > probe.pos[0] else -1
+        if not grid.fits(probe.masks, probe.pos[0] + dx, probe.pos[1]):
+            break
+        probe.pos[0] += dx
+        out.append("right" if dx > 0 else "left")
+
+    out.append("drop")
+    return out
+
+
+def playOut(engine, bot, maxPieces=None):
+    """
+    playOut (engine, bot, maxPieces): steps engine with bot.actions() until the game is over, one gravity tick per step\n
+    maxPieces : stop after this many blocks even if the game is not over\n
+    returns: (score, lines, pieces)
+    """
+    while engine.games == 0 and (maxPieces is None or engine.pieces < maxPieces):
+        #one gravity tick per step so every step places a block
+        engine.step(bot.actions(), engine.gravityInterval() + 1)
+
+    if engine.games:
+        return engine.lastScore, engine.lastLines, engine.lastPieces
+    return engine.score, engine.numLines, engine.pieces
+
+
+def playGame(heuristic=None, seed=None, lookahead=True, maxPieces=None):
+    """
+    playGame (heuristic, seed, lookahead, maxPieces): plays one headless game with an AutoPlayer\n
+    returns: (score, lines, pieces)
+    """
+    engine = TetrisEngine(seed=seed)
+    return playOut(engine, AutoPlayer(engine, heuristic, lookahead), maxPieces)
+
+
+def _playGame(args):
+    return playGame(*args)
+
+
+def runPool(func, jobs, processes=None):
+    """
+    runPool (func, jobs, processes): yields (i, func(jobs[i])) on a process pool as the calls finish\n
+    jobs      : any iterable, it is read as workers free up so only a few calls per worker are queued at a time\n
+    processes : worker processes, one per core if None
+    """
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+    processes = processes or os.cpu_count() or 1
+    jobs = enumerate(jobs)
+    with ProcessPoolExecutor(processes) as pool:
+        pending = {}
+        while True:
+            for i, job in jobs:
+                pending[pool.submit(func, job)] = i
+                if len(pending) >= processes*4:
+                    break
+            if not pending:
+                return
+            done = wait(pending, return_when=FIRST_COMPLETED)[0]
+            for future in done:
+                yield pending.pop(future), future.result()
+
+
+def evaluate(heuristic=None, games=100, seed=0, lookahead=True, maxPieces=None, processes=None):
+    """
+    evaluate (heuristic, games, seed, lookahead, maxPieces, processes): plays games with seeds seed, seed+1, ... on a process pool\n
+    processes : worker processes, one per core if None\n
+    returns: list of (score, lines, pieces) in seed order
+    """
+    results = [None]*games
+    jobs = [(heuristic, seed + i, lookahead, maxPieces) for i in range(games)]
+    for i, result in runPool(_playGame, jobs, processes):
+        results[i] = result
+    return results
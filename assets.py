@@ -0,0 +1,54 @@
+"Loads images from disk once and keeps them in the display format"
+import pygame
+
+from graphics import fonts
+from paths import find_data_file
+
+
+class Assets (object):
+    """
+    Assets (): image cache, every file is read from disk and converted at most once\n
+    the returned surfaces are shared, blit them but never draw onto them
+    """
+    def __init__(self):
+        self.images = {}
+        self.buttons = {}
+
+    def image(self, filename):
+        """
+        image (filename): returns the loaded image, converted to the display format once a display is open
+        """
+        img = self.images.get(filename)
+        if img is None:
+            img = pygame.image.load(find_data_file(filename))
+            if pygame.display.get_surface():
+                if img.get_alpha() is not None or img.get_flags() & pygame.SRCALPHA:
+                    img = img.convert_alpha()
+                else:
+                    img = img.convert()
+            self.images[filename] = img
+        return img
+
+    def preload(self, filenames):
+        """
+        preload (filenames): loads every image in filenames so nothing is read from disk later
+        """
+        for filename in filenames:
+            self.image(filename)
+
+    def button(self, filename, text, color, size=40):
+        """
+        button (filename, text, color, size): returns the image with text drawn centered on it, composited once
+        """
+        key = (filename, text, color, size)
+        img = self.buttons.get(key)
+        if img is None:
+            img = self.image(filename).copy()
+            if text:
+                t = fonts.render(text, color, size)
+                img.blit(t, (img.get_width()/2 - t.get_width()/2, img.get_height()/2 - t.get_height()/2))
+            self.buttons[key] = img
+        return img
+
+
+assets = Assets()
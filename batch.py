@@ -0,0 +1,268 @@
+"Many boards stepped at once with NumPy, for bulk simulation and training"
+import numpy as np
+
+from engine import ROTATIONS, TetrisEngine
+
+#action codes for BatchEngine.step
+NONE, LEFT, RIGHT, ROTATE, DROP = range(5)
+
+PIECE_ROWS = 4      #every piece fits in 4 rows in every rotation
+
+
+def cellArray(rows, width):
+    """
+    cellArray (rows, width): returns a (height, width) bool array of the filled cells of row masks\n
+    rows : a list of ints like Board.rows or an int64 array of rows like BatchEngine.rows[b]
+    """
+    if isinstance(rows, np.ndarray):
+        return ((rows[:, None] >> np.arange(width)) & 1).astype(bool)
+    n = (width + 7)//8
+    data = b"".join([row.to_bytes(n, "little") for row in rows])
+    bits = np.unpackbits(np.frombuffer(data, np.uint8).reshape(len(rows), n), axis=1, bitorder="little")
+    return bits[:, :width].astype(bool)
+
+
+def pieceTables():
+    """
+    pieceTables (): returns NumPy copies of the engine rotation tables\n
+    masks   : (pieces, 4, PIECE_ROWS) row masks padded with empty rows\n
+    heights : (pieces, 4) rows of each rotation, used for placement scores\n
+    widths  : (pieces, 4) columns of each rotation\n
+    kicks   : (pieces, 4, kicks, 2) [x,y] offsets tried when rotating out of each rotation
+    """
+    n = len(ROTATIONS)
+    masks = np.zeros((n, 4, PIECE_ROWS), np.int64)
+    heights = np.zeros((n, 4), np.int64)
+    widths = np.zeros((n, 4), np.int64)
+    kicks = np.zeros((n, 4, len(ROTATIONS[0][0].kicks), 2), np.int64)
+    for p in range(n):
+        for r in range(4):
+            state = ROTATIONS[p][r]
+            masks[p, r, :len(state.masks)] = state.masks
+            widths[p, r], heights[p, r] = state.size
+            kicks[p, r] = state.kicks
+    return masks, heights, widths, kicks
+
+MASKS, HEIGHTS, WIDTHS, KICKS = pieceTables()
+
+SCORES = np.array([TetrisEngine.scoreTable[m] for m in range(5)], np.int64)
+
+
+class BatchEngine (object):
+    """
+    BatchEngine (n, width, height, seed): n independent games stepped together with vectorized NumPy operations\n
+    n      : number of boards\n
+    width  : columns per board (at most 62, each row is packed into an int64)\n
+    height : rows per board\n
+    seed   : seed for the piece generator, the same seed plays the same pieces\n
+    rows[b, y] holds board b row y as a bitmask like engine.Board, the active piece of board b is
+    piece[b] in rotation rot[b] with its top left at (x[b], y[b]). Scoring, the line count and
+    speedMult follow TetrisEngine exactly, a board that tops out starts over by itself.
+    """
+    def __init__(self, n, width=10, height=24, seed=None):
+        if width > 62:
+            raise ValueError("BatchEngine boards are at most 62 columns wide")
+        self.n = n
+        self.width = width
+        self.height = height
+        self.full = (1 << width) - 1
+        self.rng = np.random.default_rng(seed)
+
+        self.rows = np.zeros((n, height), np.int64)
+        self.piece = np.zeros(n, np.int64)
+        self.nextPiece = self.rng.integers(0, len(ROTATIONS), n)
+        self.rot = np.zeros(n, np.int64)
+        self.x = np.zeros(n, np.int64)
+        self.y = np.zeros(n, np.int64)
+
+        self.score = np.zeros(n, np.int64)
+        self.numLines = np.zeros(n, np.int64)
+        self.speedMult = np.ones(n)
+        self.hard = np.zeros(n, bool)
+
+        self.games = np.zeros(n, np.int64)          #finished games per board
+        self.lastScore = np.zeros(n, np.int64)      #score of the last finished game per board
+        self.pieces = 0                             #pieces placed over all boards
+
+        self.reset()
+
+    def reset(self, idx=None):
+        """
+        reset (idx): clears the boards at the indexes idx (all boards if None) and spawns new pieces
+        """
+        if idx is None:
+            idx = np.arange(self.n)
+        self.rows[idx] = 0
+        self.score[idx] = 0
+        self.numLines[idx] = 0
+        self.speedMult[idx] = 1
+        self.hard[idx] = False
+        self.spawn(idx)
+
+    def spawn(self, idx):
+        """
+        spawn (idx): makes the next piece active on the boards idx, just above the board at a random column
+        """
+        piece = self.nextPiece[idx]
+        self.piece[idx] = piece
+        self.rot[idx] = 0
+        self.x[idx] = self.rng.integers(0, self.width - WIDTHS[piece, 0] + 1)
+        self.y[idx] = -HEIGHTS[piece, 0]
+        self.nextPiece[idx] = self.rng.integers(0, len(ROTATIONS), len(idx))
+
+    def collides(self, idx, piece, rot, x, y):
+        """
+        collides (idx, piece, rot, x, y): returns True where the piece would leave the board or overlap the stack\n
+        idx is an array of board indexes, the other arguments are broadcast with it\n
+        rows above the top of the board are open so pieces can spawn there
+        """
+        masks = MASKS[piece, rot]
+        hit = x < 0
+        shifted = masks << np.maximum(x, 0)[..., None]
+        hit = hit | (shifted & ~self.full != 0).any(-1)
+
+        r = y[..., None] + np.arange(PIECE_ROWS)
+        hit = hit | ((r >= self.height) & (masks != 0)).any(-1)
+
+        inside = (r >= 0) & (r < self.height)
+        board = self.rows[idx[..., None], np.clip(r, 0, self.height - 1)]
+        hit = hit | (inside & (board & shifted != 0)).any(-1)
+        return hit
+
+    def landing(self, idx, piece, rot, x, y):
+        """
+        landing (idx, piece, rot, x, y): returns the row each piece comes to rest on when dropped straight down from y
+        """
+        fall = np.arange(self.height + PIECE_ROWS + 1)
+        hit = self.collides(idx[:, None], piece[:, None], rot[:, None], x[:, None], y[:, None] + fall)
+        first = np.argmax(hit, 1)   #the floor below the board always collides
+        return y + np.maximum(first - 1, 0)
+
+    def move(self, idx, dx):
+        ok = ~self.collides(idx, self.piece[idx], self.rot[idx], self.x[idx] + dx, self.y[idx])
+        self.x[idx[ok]] += dx
+
+    def rotate(self, idx):
+        piece = self.piece[idx]
+        rot = self.rot[idx]
+        newRot = (rot + 1) % 4
+        pending = np.ones(len(idx), bool)
+        for k in range(KICKS.shape[2]):
+            kick = KICKS[piece, rot, k]
+            x = self.x[idx] + kick[:, 0]
+            y = self.y[idx] + kick[:, 1]
+            ok = pending & ~self.collides(idx, piece, newRot, x, y)
+            moved = idx[ok]
+            self.x[moved] = x[ok]
+            self.y[moved] = y[ok]
+            self.rot[moved] = newRot[ok]
+            pending &= ~ok
+
+    def drop(self, idx):
+        self.y[idx] = self.landing(idx, self.piece[idx], self.rot[idx], self.x[idx], self.y[idx])
+        self.hard[idx] = True
+
+    def lock(self, idx):
+        """
+        lock (idx): places the active pieces of the boards idx, clears rows, scores and spawns the next pieces\n
+        returns: (rows cleared, topped out) for each board in idx
+        """
+        piece = self.piece[idx]
+        rot = self.rot[idx]
+        masks = MASKS[piece, rot]
+        shifted = masks << self.x[idx][:, None]
+        r = self.y[idx][:, None] + np.arange(PIECE_ROWS)
+
+        done = ((r <= 0) & (masks != 0)).any(1)
+        inside = (r >= 0) & (r < self.height)
+        rc = np.clip(r, 0, self.height - 1)
+        for j in range(PIECE_ROWS):
+            self.rows[idx, rc[:, j]] |= np.where(inside[:, j], shifted[:, j], 0)
+
+        #like TetrisEngine.placeBlocks a piece that tops out ends the game before anything is scored
+        placed = idx[~done]
+        self.score[placed] += HEIGHTS[piece[~done], rot[~done]] * np.where(self.hard[placed], 2, 1)
+        self.hard[placed] = False
+        self.pieces += len(placed)
+
+        lines = np.zeros(len(idx), np.int64)
+        lines[~done] = self.clearRows(placed)
+
+        over = idx[done]
+        if len(over):
+            self.lastScore[over] = self.score[over]
+            self.games[over] += 1
+            self.reset(over)
+
+        self.spawn(idx[~done])
+        return lines, done
+
+    def clearRows(self, idx):
+        """
+        clearRows (idx): removes full rows on the boards idx, shifts the rows above down and scores them\n
+        returns: rows cleared per board
+        """
+        rows = self.rows[idx]
+        full = rows == self.full
+        m = full.sum(1)
+        if m.any():
+            #stable sort puts the full rows on top keeping the order of the rest, then they are emptied
+            order = np.argsort(~full, axis=1, kind="stable")
+            rows = np.take_along_axis(rows, order, 1)
+            rows[np.arange(self.height) < m[:, None]] = 0
+            self.rows[idx] = rows
+
+            self.score[idx] += SCORES[np.minimum(m, 4)]
+            lines = self.numLines[idx] + m
+            self.numLines[idx] = lines
+            self.speedMult[idx] = np.where(lines > 0, np.trunc((lines - 10)/10)/10 + 1, self.speedMult[idx])
+        return m
+
+    def step(self, actions):
+        """
+        step (actions): applies one action per board then one row of gravity to every board\n
+        actions : (n,) array of NONE, LEFT, RIGHT, ROTATE or DROP\n
+        returns: (rows cleared, topped out) arrays of length n
+        """
+        actions = np.asarray(actions)
+        for code, dx in ((LEFT, -1), (RIGHT, 1)):
+            idx = np.flatnonzero(actions == code)
+            if len(idx):
+                self.move(idx, dx)
+        idx = np.flatnonzero(actions == ROTATE)
+        if len(idx):
+            self.rotate(idx)
+        idx = np.flatnonzero(actions == DROP)
+        if len(idx):
+            self.drop(idx)
+
+        lines = np.zeros(self.n, np.int64)
+        done = np.zeros(self.n, bool)
+
+        boards = np.arange(self.n)
+        down = ~self.collides(boards, self.piece, self.rot, self.x, self.y + 1)
+        self.y[down] += 1
+        idx = np.flatnonzero(~down)
+        if len(idx):
+            lines[idx], done[idx] = self.lock(idx)
+        return lines, done
+
+    def place(self, rot, x, hard=True):
+        """
+        place (rot, x, hard): drops every active piece in rotation rot[b] from column x[b] and places it\n
+        placements that do not fit at the top of the board keep the current rotation and column\n
+        hard : score the placements as hard drops like the drop key does\n
+        returns: (rows cleared, topped out) arrays of length n
+        """
+        boards = np.arange(self.n)
+        rot = np.asarray(rot) % 4
+        x = np.asarray(x)
+        y = np.minimum(self.y, -HEIGHTS[self.piece, rot])
+        ok = ~self.collides(boards, self.piece, rot, x, y)
+        self.rot = np.where(ok, rot, self.rot)
+        self.x = np.where(ok, x, self.x)
+        self.y = np.where(ok, y, self.y)
+
+        self.y = self.landing(boards, self.piece, self.rot, self.x, self.y)
+        self.hard[:] = hard
+        return self.lock(boards)
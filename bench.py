@@ -0,0 +1,288 @@
+"""
+Benchmarks for the engine and renderer hot paths
+
+    python bench.py                          run everything and print the results
+    python bench.py --save bench.json        also store them as a baseline
+    python bench.py --compare bench.json     fail if anything got slower than the baseline by more than --threshold
+    python bench.py --startup                time python main.py to its first menu frame, fail over --budget
+    python bench.py --startup --exe build/exe.win-amd64-3.11/main.exe    the same for the frozen build
+
+Runs headless, SDL_VIDEODRIVER defaults to dummy. Times are the best of several repeats in
+microseconds per call, so a noisy machine makes them look slower, never faster.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from engine import Block, TetrisEngine
+
+benchmarks = []
+
+def benchmark(name):
+    """
+    benchmark (name): decorator registering a setup function, it returns the function to time
+    """
+    def register(setup):
+        benchmarks.append((name, setup))
+        return setup
+    return register
+
+
+def makeRows(engine, filled):
+    """
+    makeRows (engine, filled): returns board rows with the bottom filled rows full except for one cell each
+    """
+    rows = [0]*engine.height
+    for i in range(filled):
+        y = engine.height - 1 - i
+        rows[y] = engine.grid.full & ~(1 << ((y*7) % engine.width))
+    return rows
+
+#empty, half full and one row short of topping out
+BOARDS = {"empty": 0, "half": 12, "topout": 21}
+
+
+def newEngine(filled=0):
+    engine = TetrisEngine(seed=1)
+    engine.grid.setRows(makeRows(engine, filled))
+    return engine
+
+
+@benchmark("Block.rotate")
+def benchRotate():
+    engine = newEngine(BOARDS["half"])
+    block = Block(None, (200,200,200), [3, 4], 2)
+    grid = engine.grid
+    return lambda: block.rotate(grid)
+
+@benchmark("Block.floor")
+def benchFloor():
+    engine = newEngine(BOARDS["half"])
+    block = Block(None, (200,200,200), [3, -2], 2)
+    grid = engine.grid
+    def run():
+        block.pos[1] = -2
+        block.floor(grid)
+    return run
+
+@benchmark("Block.getAbsPos")
+def benchAbsPos():
+    engine = newEngine()
+    block = Block(None, (200,200,200), [3, 4], 1)
+    grid = engine.grid
+    return lambda: block.getAbsPos(grid)
+
+@benchmark("TetrisEngine.clearRows")
+def benchClearRows():
+    engine = newEngine()
+    rows = makeRows(engine, BOARDS["half"])
+    for y in range(engine.height - 4, engine.height):
+        rows[y] = engine.grid.full
+    def run():
+        engine.grid.setRows(list(rows))
+        engine.clearRows()
+    return run
+
+@benchmark("TetrisEngine.step")
+def benchStep():
+    engine = newEngine(BOARDS["half"])
+    return lambda: engine.step(["left"], 1000/120)
+
+@benchmark("Block.draw")
+def benchBlockDraw():
+    block = Block(None, (200,200,200), [3, 4], 1)
+    return lambda: block.draw(30, 2)
+
+@benchmark("Button.draw")
+def benchButtonDraw():
+    import main
+    button = main.Button(["b.png", "bP.png"], "START", (222,222,222), (450, 100), centered=True)
+    return button.draw
+
+@benchmark("Controls.input")
+def benchControls():
+    from controls import Controls
+    controls = Controls({"left": "a", "right": "d", "speed": "s", "drop": "space", "rotate": "r"})
+    down = pygame.event.Event(pygame.KEYDOWN, key=pygame.K_a)
+    up = pygame.event.Event(pygame.KEYUP, key=pygame.K_a)
+    def run():
+        controls.handle(down, 0)
+        controls.actions(1)
+        controls.handle(up, 2)
+    return run
+
+def layerBenchmark(layer):
+    def setup():
+        from engine import Board
+        board = Board(100, 200)
+        rows = [board.full & ~(1 << ((y*7) % 100)) if y >= 100 else 0 for y in range(200)]
+        board.setRows(rows)
+        stack = layer((300, 600), (22,22,22), (200,200,200), 3, 0)
+        stack.update(board)
+
+        #one cell changes per call, like a piece locking on a big board
+        def run():
+            board.rows[150] ^= 1
+            board.version += 1
+            stack.update(board)
+        return run
+    return setup
+
+@benchmark("StackLayer.big")
+def benchStackLayer():
+    from graphics import StackLayer
+    return layerBenchmark(StackLayer)()
+
+@benchmark("ArrayLayer.big")
+def benchArrayLayer():
+    from pixels import ArrayLayer
+    return layerBenchmark(ArrayLayer)()
+
+def frameBenchmark(filled):
+    def setup():
+        import main
+        from engine import Scheduler
+        from controls import Controls
+
+        main.settings = {"left": "a", "right": "d", "speed": "s", "drop": "space", "rotate": "r"}
+        main.controls = Controls(main.settings)
+        screen = pygame.display.get_surface()
+        display = pygame.Surface(main.size)
+        engine = newEngine()
+        rows = makeRows(engine, filled)
+        game = main.GameScreen(screen, display, engine, Scheduler())
+        clock = [0]
+
+        #the board is put back every frame so the stack layer redraws like on a lock or row clear,
+        #the worst case frame
+        def run():
+            engine.grid.setRows(list(rows))
+            clock[0] += game.scheduler.dt
+            game.frame(clock[0])
+        return run
+    return setup
+
+for name in BOARDS:
+    benchmark("frame." + name)(frameBenchmark(BOARDS[name]))
+
+
+def timeit(run, minTime=0.2, repeat=5):
+    """
+    timeit (run, minTime, repeat): returns the best time in microseconds per call of run
+    """
+    n = 1
+    while True:
+        start = time.perf_counter()
+        for i in range(n):
+            run()
+        took = time.perf_counter() - start
+        if took >= minTime/repeat:
+            break
+        n *= 2
+
+    best = took/n
+    for r in range(repeat - 1):
+        start = time.perf_counter()
+        for i in range(n):
+            run()
+        best = min(best, (time.perf_counter() - start)/n)
+    return best*1e6
+
+
+def runAll(only=None):
+    """
+    runAll (only): runs every benchmark whose name contains only (all if None), returns {name: microseconds}
+    """
+    pygame.init()
+    if not pygame.display.get_surface():
+        import main
+        pygame.display.set_mode((main.size[0] + main.panelSize, main.size[1]))
+
+    results = {}
+    for name, setup in benchmarks:
+        if only and only not in name:
+            continue
+        results[name] = timeit(setup())
+    return results
+
+
+def startup(command, runs=5):
+    """
+    startup (command, runs): returns the startup times in ms of command, from launch to the first menu frame\n
+    the game exits right after that frame when TETRIS_STARTUP_BENCH is set, saves and scores are left alone
+    """
+    env = dict(os.environ, TETRIS_STARTUP_BENCH="1")
+    times = []
+    for i in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(command[-1])))
+        times.append((time.perf_counter() - start)*1000)
+    return times
+
+
+def compare(results, baseline, threshold):
+    """
+    compare (results, baseline, threshold): returns the names slower than baseline by more than threshold (0.1 = 10%)
+    """
+    slower = []
+    for name in results:
+        if name in baseline and results[name] > baseline[name]*(1 + threshold):
+            slower.append(name)
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the engine and renderer hot paths")
+    parser.add_argument("--only", default=None, help="run only benchmarks whose name contains this")
+    parser.add_argument("--save", default=None, help="write the results to this JSON file")
+    parser.add_argument("--compare", default=None, help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before failing (0.2 = 20%%)")
+    parser.add_argument("--startup", action="store_true", help="measure the game's startup time instead")
+    parser.add_argument("--exe", default=None, help="frozen executable to start instead of python main.py")
+    parser.add_argument("--runs", type=int, default=5, help="startup runs, the median is compared to the budget")
+    parser.add_argument("--budget", type=float, default=1000, help="startup budget in ms")
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        command = [args.exe] if args.exe else [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")]
+        times = sorted(startup(command, args.runs))
+        median = times[len(times)//2]
+        print("startup: median %.0f ms, best %.0f ms, worst %.0f ms, budget %.0f ms" % (median, times[0], times[-1], args.budget))
+        if median > args.budget:
+            print("over the startup budget")
+            return 1
+        return 0
+
+    results = runAll(args.only)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    for name in results:
+        line = "%-24s %12.2f us" % (name, results[name])
+        if name in baseline:
+            line += "   %+6.1f%%" % ((results[name]/baseline[name] - 1)*100)
+        print(line)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    slower = compare(results, baseline, args.threshold)
+    if slower:
+        print("slower than the baseline: " + ", ".join(slower))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+Thin pygame frontend for server.py, the game runs on the server and only its changes come over the wire
+
+    python client.py --host 127.0.0.1 --port 7777 [--versus]
+
+Keys come from settings.txt like in the local game.
+"""
+import argparse
+import ast
+import socket
+import sys
+import time
+
+import pygame
+
+from engine import Block, Board
+from graphics import StackLayer, fonts
+from assets import find_data_file
+from controls import Controls
+from replay import CODES
+from server import (HELLO, INPUT, FULL, STATE, OVER, SOLO, VERSUS, FULL_HEAD, STATE_HEAD, OVER_BODY,
+                    Reader, message, unpackRows)
+
+gridW = 30
+panelSize = 300
+resultTime = 3    #seconds the result of a game stays up, the next game has already started by then
+
+
+class Client (object):
+    """
+    Client (host, port, mode): a connection to a server and the server's game as last received\n
+    board and block are a local Board and Block rebuilt from FULL and STATE messages so they draw like the local game\n
+    result is the text of the last OVER and resultAt when it came, the FULL of the next game follows right behind it
+    """
+    def __init__(self, host, port, mode=SOLO):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setblocking(False)
+        self.reader = Reader()
+
+        self.board = None
+        self.block = None
+        self.nextPiece = None
+        self.score = 0
+        self.lines = 0
+        self.opponent = -1
+        self.result = ""
+        self.resultAt = 0
+        self.connected = True
+
+        self.sock.sendall(message(HELLO, bytes([mode])))
+
+    def poll(self):
+        """
+        poll (): reads and applies everything the server sent since the last call, never waits
+        """
+        while True:
+            try:
+                data = self.sock.recv(1 << 16)
+            except BlockingIOError:
+                return
+            except OSError:
+                data = b""
+            if not data:
+                self.connected = False
+                return
+            for kind, body in self.reader.feed(data):
+                self.apply(kind, body)
+
+    def apply(self, kind, body):
+        if kind == FULL:
+            width, height, seed = FULL_HEAD.unpack_from(body)
+            self.board = Board(width, height)
+            self.board.setRows(unpackRows(body[FULL_HEAD.size:], width, height))
+            self.block = None
+
+        elif kind == STATE and self.board is not None:
+            tick, self.score, self.lines, piece, rotation, x, y, self.nextPiece, self.opponent, count = STATE_HEAD.unpack_from(body)
+            self.block = Block(None, (200,200,200), [x, y], piece)
+            self.block.setRotation(rotation)
+
+            board = self.board
+            n = (board.width + 7)//8
+            i = STATE_HEAD.size
+            for c in range(count):
+                board.rows[body[i]] = int.from_bytes(body[i+1:i+1+n], "little")
+                i += 1 + n
+            if count:
+                board.version += 1
+
+        elif kind == OVER:
+            score, won = OVER_BODY.unpack(body)
+            self.result = ("won with %d" if won else "lost with %d") % score
+            self.resultAt = time.monotonic()
+
+    def send(self, actions):
+        """
+        send (actions): sends this frame's actions to the server
+        """
+        if actions:
+            try:
+                self.sock.sendall(message(INPUT, bytes([CODES[a] for a in actions])))
+            except OSError:
+                self.connected = False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play tetris on a server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--versus", action="store_true", help="wait for a second player and race them")
+    args = parser.parse_args(argv)
+
+    pygame.init()
+    pygame.display.set_caption("Tetris")
+
+    with open(find_data_file("settings.txt")) as f:
+        settings = ast.literal_eval(f.read())
+    controls = Controls(settings)
+
+    client = Client(args.host, args.port, VERSUS if args.versus else SOLO)
+    screen = None
+    stack = None
+    clock = pygame.time.Clock()
+
+    while client.connected:
+        now = pygame.time.get_ticks()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return 0
+            controls.handle(event, now)
+        client.send(controls.actions(now))
+        client.poll()
+
+        board = client.board
+        if board is None:
+            if screen is None:
+                screen = pygame.display.set_mode((300 + panelSize, 720))
+            screen.fill((222,222,222))
+            t = fonts.render("waiting for a player", (22,22,22), 35)
+            screen.blit(t, (screen.get_width()/2 - t.get_width()/2, 340))
+            pygame.display.flip()
+            clock.tick(30)
+            continue
+
+        size = (board.width*gridW, board.height*gridW)
+        if screen is None or screen.get_size() != (size[0] + panelSize, size[1]):
+            screen = pygame.display.set_mode((size[0] + panelSize, size[1]))
+            stack = StackLayer(size, (22,22,22), (200,200,200), gridW, 2)
+
+        stack.update(board)
+        screen.blit(stack.surface, (0,0))
+        if client.block:
+            block = client.block
+            screen.blit(block.draw(gridW, 2), (block.pos[0]*gridW, block.pos[1]*gridW))
+
+        screen.fill((222,222,222), (size[0], 0, panelSize, size[1]))
+        sc = fonts.render(str(client.score), (22,22,22), 60)
+        screen.blit(sc, (size[0] + panelSize/2 - sc.get_width()/2, 20))
+        if client.nextPiece is not None:
+            nb = Block(None, (200,200,200), [0,0], client.nextPiece).draw(gridW, 2)
+            screen.blit(nb, (size[0] + panelSize/2 - nb.get_width()/2, 200))
+        if client.opponent >= 0:
+            op = fonts.render("rival %d" % client.opponent, (22,22,22), 40)
+            screen.blit(op, (size[0] + panelSize/2 - op.get_width()/2, 400))
+        if client.result and time.monotonic() - client.resultAt < resultTime:
+            r = fonts.render(client.result, (22,22,22), 35)
+            screen.blit(r, (size[0] + panelSize/2 - r.get_width()/2, 500))
+
+        pygame.display.flip()
+        clock.tick(60)
+
+    print("disconnected")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
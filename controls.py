@@ -0,0 +1,98 @@
+"Event driven keyboard input with delayed auto shift and auto repeat"
+import pygame
+
+from engine import ACTIONS
+
+#actions that repeat while their key is held
+REPEATING = ["left", "right"]
+
+
+def keyCode(name):
+    """
+    keyCode (name): returns the pygame key code for a key name as stored in settings.txt, or None if unknown
+    """
+    try:
+        return pygame.key.key_code(name)
+    except ValueError:
+        return None
+
+
+class Controls (object):
+    """
+    Controls (settings): turns KEYDOWN/KEYUP events into game actions\n
+    settings : dict of action -> key name, "das" and "arr" (ms) are optional\n
+    das : delay before a held left/right starts repeating\n
+    arr : time between repeats once it has started\n
+    every press is queued with its time so taps between frames are never lost
+    """
+    def __init__(self, settings):
+        self.queue = []     #(time, action) of presses not yet handed to the game
+        self.held = {}      #action -> time its key went down
+        self.repeatAt = {}  #action -> time of its next auto repeat
+        self.typed = []     #names of keys pressed this frame, for text inputs
+        self.bind(settings)
+
+    def bind(self, settings):
+        """
+        bind (settings): rebuilds the key code -> action table from settings
+        """
+        self.keymap = {}
+        for action in ACTIONS:
+            if action in settings:
+                code = keyCode(settings[action])
+                if code is not None:
+                    self.keymap[code] = action
+
+        self.das = settings.get("das", 170)
+        self.arr = max(settings.get("arr", 50), 1)
+        self.clear()
+
+    def clear(self):
+        """
+        clear (): forgets queued presses and held keys
+        """
+        self.queue = []
+        self.held = {}
+        self.repeatAt = {}
+
+    def handle(self, event, now):
+        """
+        handle (event, now): records a pygame event that happened at now (ms)
+        """
+        if event.type == pygame.KEYDOWN:
+            self.typed.append(pygame.key.name(event.key))
+
+            action = self.keymap.get(event.key)
+            if action and action not in self.held:
+                self.held[action] = now
+                self.queue.append((now, action))
+                if action in REPEATING:
+                    self.repeatAt[action] = now + self.das
+
+        elif event.type == pygame.KEYUP:
+            action = self.keymap.get(event.key)
+            if action in self.held:
+                del self.held[action]
+                self.repeatAt.pop(action, None)
+
+    def actions(self, now):
+        """
+        actions (now): returns every action due by now (ms) in order, including auto repeats and a held or tapped "speed"
+        """
+        events = self.queue
+        self.queue = []
+
+        for action in REPEATING:
+            t = self.repeatAt.get(action)
+            if t is not None:
+                while t <= now:
+                    events.append((t, action))
+                    t += self.arr
+                self.repeatAt[action] = t
+
+        events.sort(key=lambda e: e[0])
+        out = [action for t,action in events if action != "speed"]
+        #a tap released within the frame still counts once
+        if "speed" in self.held or len(out) < len(events):
+            out.append("speed")
+        return out
@@ -0,0 +1,623 @@
+"Headless tetris rules, importable without opening a window"
+import random
+from random import randint
+
+#actions a player can bind to keys, TetrisEngine.step also takes "restart"
+ACTIONS = ["left", "right", "speed", "drop", "rotate"]
+
+
+def rowMasks(data):
+    """
+    rowMasks (data): returns one integer per row of data with bit x set where data[y][x] is 1
+    """
+    masks = []
+    for row in data:
+        m = 0
+        for x in range(len(row)):
+            if row[x] == 1:
+                m |= 1 << x
+        masks.append(m)
+    return tuple(masks)
+
+
+class RotationState (object):
+    """
+    RotationState (data): one precomputed orientation of a piece\n
+    data  : the 2D aray of 1's & 0's for this orientation\n
+    size  : (w,h) bounding box\n
+    masks : row masks, see rowMasks\n
+    cells : (x,y) offsets of every filled cell from the top left\n
+    bottoms : (x,y) offset of the lowest filled cell in each column that has one\n
+    kicks : [x,y] position offsets to try, in order, when rotating into the next state
+    """
+    def __init__(self, data):
+        self.data = data
+        self.size = (len(data[0]), len(data))
+        self.masks = rowMasks(data)
+        self.cells = tuple((x,y) for y in range(len(data)) for x in range(len(data[0])) if data[y][x] == 1)
+        self.bottoms = tuple((x, max(y for x2,y in self.cells if x2 == x)) for x in sorted(set(x for x,y in self.cells)))
+
+        #keeps the piece roughly centered while its bounding box changes shape
+        w,h = self.size
+        x = w-h
+        n = 0
+        u = 0
+        if x != 0:
+            n = 1 if x > 0 else -1
+            if x == 3: u = 1
+            elif x == -3: u = -1
+        self.kicks = ((n,u), (n-1,u), (n+1,u))
+
+
+def rotateData(data):
+    """
+    rotateData (data): returns data rotated a quarter turn clockwise
+    """
+    w = len(data[0])
+    h = len(data)
+    return [[data[y][x] for y in range(h)][::-1] for x in range(w)]
+
+
+def makeStates(data):
+    """
+    makeStates (data): returns the four RotationStates of a piece starting from data
+    """
+    states = []
+    for i in range(4):
+        states.append(RotationState(data))
+        data = rotateData(data)
+    return tuple(states)
+
+
+PIECES = [
+    [[1,1,1,1]],
+    [[1,0,0],[1,1,1]],
+    [[0,0,1],[1,1,1]],
+    [[1,1],[1,1]],
+    [[0,1,1],[1,1,0]],
+    [[0,1,0],[1,1,1]],
+    [[1,1,0],[0,1,1]],
+] #all posible cominations
+
+#every rotation of every piece, built once at import
+ROTATIONS = [makeStates(data) for data in PIECES]
+
+_shapeStates = {}
+for i in range(len(PIECES)):
+    _shapeStates[tuple(map(tuple, PIECES[i]))] = ROTATIONS[i]
+
+def getStates(data):
+    """
+    getStates (data): returns the rotation table for a shape, building and caching it for shapes other than the seven pieces
+    """
+    key = tuple(map(tuple, data))
+    states = _shapeStates.get(key)
+    if states is None:
+        states = makeStates(data)
+        _shapeStates[key] = states
+    return states
+
+
+class PieceType (object):
+    """
+    PieceType (index, states, color): one kind of piece, shared by every Block of that kind and never changed\n
+    index  : index into PIECES, None for other shapes\n
+    states : its four RotationStates\n
+    color  : (r,g,b)
+    """
+    __slots__ = ("index", "states", "color")
+
+    def __init__(self, index, states, color):
+        self.index = index
+        self.states = states
+        self.color = color
+
+
+_types = {}
+
+def getType(states, color, index=None):
+    """
+    getType (states, color, index): returns the shared PieceType for a rotation table and color, making it the first time
+    """
+    key = (states, color)
+    pieceType = _types.get(key)
+    if pieceType is None:
+        pieceType = PieceType(index, states, color)
+        _types[key] = pieceType
+    return pieceType
+
+
+class Block (object):
+    """
+    Block (data,color,pos): handles block graphics and position\n
+    data  : a 2D aray with 1's & 0's (1=block) or "random" for random generation\n
+    color : (r,g,b)\n
+    pos   : [x,y] where to render the block (from top left)\n
+    piece : optional index into PIECES, used instead of data\n
+    only the PieceType, rotation and position are stored per block, everything else comes from the shared type
+    """
+    __slots__ = ("type", "rotation", "state", "pos")
+
+    def __init__(self,data, color, pos, piece=None):
+        self.pos = pos
+
+        if piece is None and data == "random":
+            piece = randint(0, len(PIECES)-1)
+        if piece is not None:
+            self.type = getType(ROTATIONS[piece], color, piece)
+        else:
+            self.type = getType(getStates(data), color)
+
+        self.setRotation(0)
+
+    @property
+    def piece(self):
+        return self.type.index
+
+    @property
+    def states(self):
+        return self.type.states
+
+    @property
+    def color(self):
+        return self.type.color
+
+    @property
+    def data(self):
+        return self.state.data
+
+    @property
+    def size(self):
+        return self.state.size
+
+    @property
+    def masks(self):
+        return self.state.masks
+
+    def setRotation(self, rotation):
+        """
+        setRotation (rotation): switches the block to one of its precomputed RotationStates
+        """
+        self.rotation = rotation
+        self.state = self.type.states[rotation]
+
+    def draw(self, gridSize, borderLen):
+        """
+        draw (gridSize, borderLen): returns the cached Surface of the specified block, blit it but never draw onto it\n
+        gridSize  : the global grid size for the game (int)\n
+        borderLen : the width of the border between individual grids (int)\n
+        """
+        #imported here so the rest of the engine never loads pygame
+        from graphics import atlas
+        return atlas.piece(self.color, gridSize, borderLen, self.state)
+
+    def getAbsPos(self, grid):
+        """
+        getAbsPos (grid): returns the position of each individual block in a Block on the grid\n
+        grid : grid data ex| 18x18 full of zeros
+        """
+        x1,y1 = self.pos
+        return [(x1 + x, y1 + y) for x,y in self.state.cells]
+
+    def randomData(self):
+        return PIECES[randint(0, len(PIECES)-1)]
+
+    def rotate(self, grid):
+        """
+        rotate (grid): turns the block clockwise, trying each kick offset until one fits on the grid\n
+        grid : a Board
+        """
+        x,y = self.pos
+        rotation = (self.rotation + 1) % 4
+        masks = self.states[rotation].masks
+        for n,u in self.state.kicks:
+            if grid.fits(masks, x+n, y+u):
+                self.pos[0] = x+n
+                self.pos[1] = y+u
+                self.setRotation(rotation)
+                return True
+        return False
+
+    def floor(self, grid):
+        """
+        floor (grid): moves the block straight down until it rests on the stack or the bottom of the grid\n
+        grid : a Board
+        """
+        x,y = self.pos
+        self.pos[1] = grid.landing(self.state, x, y)
+
+
+class Board (object):
+    """
+    Board (width, height): the placed blocks stored as one integer bitmask per row\n
+    bit x of rows[y] is set when the cell at column x, row y is filled\n
+    tops[x] is the row of the highest filled cell in column x (height if the column is empty),
+    kept up to date by lock and clearRows, call setRows after replacing rows\n
+    rows above the top of the board (y < 0) are always empty so new blocks can spawn there
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.full = (1 << width) - 1
+        self.wall = ~self.full      #every bit outside the board
+        self.rows = [0]*height
+        self.tops = [height]*width
+        self.filled = []            #rows that became full since the last clearRows
+        self.version = 0            #bumped whenever a cell changes so renderers know to redraw
+
+    def __len__(self):
+        return self.height
+
+    def setRows(self, rows):
+        """
+        setRows (rows): replaces every row mask and rebuilds the column heights
+        """
+        self.rows = rows
+        self.filled = [y for y in range(self.height) if rows[y] == self.full]
+        self.findTops()
+        self.version += 1
+
+    def findTops(self):
+        tops = [self.height]*self.width
+        covered = 0
+        for y in range(self.height):
+            new = self.rows[y] & ~covered
+            while new:
+                low = new & -new
+                tops[low.bit_length()-1] = y
+                new ^= low
+            covered |= self.rows[y]
+        self.tops = tops
+
+    def cell(self, x, y):
+        """
+        cell (x, y): returns 1 if the cell is filled else 0
+        """
+        return (self.rows[y] >> x) & 1
+
+    def fits(self, masks, x, y):
+        """
+        fits (masks, x, y): returns True if a piece with the given row masks at (x,y) is inside the board and overlaps nothing\n
+        masks : row masks of the piece, see rowMasks
+        """
+        if x < 0:
+            return False
+        rows = self.rows
+        wall = self.wall
+        for i in range(len(masks)):
+            m = masks[i] << x
+            if m:
+                if m & wall:
+                    return False
+                r = y + i
+                if r >= 0 and (r >= self.height or rows[r] & m):
+                    return False
+        return True
+
+    def landing(self, state, x, y):
+        """
+        landing (state, x, y): returns the row a piece in the given RotationState at (x,y) comes to rest on when dropped\n
+        the column heights give the answer in one pass over the piece's columns, only a piece that was slid in
+        under an overhang has to be walked down row by row
+        """
+        tops = self.tops
+        rest = self.height
+        for i,b in state.bottoms:
+            r = tops[x+i] - 1 - b
+            if r < rest:
+                rest = r
+        if rest >= y:
+            return rest
+
+        masks = state.masks
+        while self.fits(masks, x, y+1):
+            y += 1
+        return y
+
+    def lock(self, masks, x, y):
+        """
+        lock (masks, x, y): fills the cells of a piece, returns False if any cell is above the top row
+        """
+        inside = True
+        tops = self.tops
+        for i in range(len(masks)):
+            m = masks[i]
+            if m:
+                r = y + i
+                if r <= 0:
+                    inside = False
+                if r >= 0:
+                    row = self.rows[r] | m << x
+                    self.rows[r] = row
+                    if row == self.full:
+                        self.filled.append(r)
+                    #only the piece's columns can get taller
+                    c = x
+                    while m:
+                        if m & 1 and r < tops[c]:
+                            tops[c] = r
+                        m >>= 1
+                        c += 1
+        self.version += 1
+        return inside
+
+    def clearRows(self):
+        """
+        clearRows (): removes full rows and shifts everything above them down, returns the number removed\n
+        only the rows lock saw filling up are looked at, so a lock that fills no row costs nothing here
+        """
+        filled = self.filled
+        n = len(filled)
+        if n:
+            rows = self.rows
+            for y in sorted(filled, reverse=True):
+                del rows[y]
+            rows[0:0] = [0]*n
+            self.filled = []
+            self.findTops()
+            self.version += 1
+        return n
+
+
+def speedFor(numLines):
+    """
+    speedFor (numLines): returns the speedMult reached after clearing numLines rows
+    """
+    if numLines > 0:
+        x = int((numLines - 10)/10)/10
+        return x +1
+    return 1
+
+
+class PieceSource (object):
+    """
+    PieceSource (seed, bag): per game random generator for which piece comes next and where it spawns\n
+    seed : any int, the same seed gives the same pieces and columns, a random one is picked if None\n
+    bag  : deal the seven pieces in shuffled sets of seven instead of independently
+    """
+    def __init__(self, seed=None, bag=False):
+        if seed is None:
+            seed = random.getrandbits(63)
+        self.seed = seed
+        self.bag = bag
+        self.rng = random.Random(seed)
+        self.queue = []
+
+    def nextPiece(self):
+        """
+        nextPiece (): returns the index into PIECES of the next piece
+        """
+        if not self.bag:
+            return self.rng.randint(0, len(PIECES)-1)
+        if not self.queue:
+            self.queue = list(range(len(PIECES)))
+            self.rng.shuffle(self.queue)
+        return self.queue.pop()
+
+    def column(self, width, pieceWidth):
+        """
+        column (width, pieceWidth): returns a random spawn column that keeps the piece inside the grid
+        """
+        return self.rng.randint(0, width - pieceWidth)
+
+
+class TetrisEngine (object):
+    """
+    TetrisEngine (width, height, onLoose, seed, bag): owns the grid, active and next Block, row clears and scoring\n
+    width   : number of columns in the grid\n
+    height  : number of rows in the grid\n
+    onLoose : optional function run with the final score when the stack tops out\n
+    seed    : seed of the PieceSource, games with the same seed and actions play out the same\n
+    bag     : use a 7-bag PieceSource\n
+    step(actions, dt) advances the game without needing a display
+    """
+    scoreTable = {0: 0, 1: 40, 2: 100, 3: 300, 4: 1200}
+
+    def __init__(self, width=10, height=24, onLoose=None, seed=None, bag=False):
+        self.width = width
+        self.height = height
+        self.onLoose = onLoose
+        self.source = PieceSource(seed, bag)
+        self.seed = self.source.seed
+
+        self.gTime = 500        #gravity interval before speedMult (ms)
+        self.gravityTimer = 0
+        self.games = 0
+        self.lastScore = 0
+        self.lastLines = 0
+        self.lastPieces = 0
+
+        self.reset()
+
+    def reset(self):
+        """
+        reset (): clears the grid and scores and spawns new blocks
+        """
+        self.grid = Board(self.width, self.height)
+
+        self.block = self.newBlock()
+        self.nextBlock = self.newBlock()
+
+        self.score = 0
+        self.numLines = 0
+        self.speedMult = 1
+        self.hard = False   #wether or not the active block was hard dropped
+        self.gravityTimer = 0
+        self.pieces = 0     #blocks placed this game
+
+    def newBlock(self):
+        """
+        newBlock (): returns the next Block from the PieceSource placed just above the grid at a random column
+        """
+        piece = self.source.nextPiece()
+        w,h = ROTATIONS[piece][0].size
+        return Block(None, (200,200,200), [self.source.column(self.width, w), 0-h], piece)
+
+    def move(self, dx):
+        """
+        move (dx): moves the active block sideways if there is room, returns True if it moved
+        """
+        block = self.block
+        if self.grid.fits(block.state.masks, block.pos[0] + dx, block.pos[1]):
+            self.block.pos[0] += dx
+            return True
+        return False
+
+    def rotate(self):
+        self.block.rotate(self.grid)
+
+    def drop(self):
+        """
+        drop (): hard drops the active block, it is placed on the next gravity tick
+        """
+        self.block.floor(self.grid)
+        self.hard = True
+
+    def landing(self):
+        """
+        landing (): returns the row the active block would land on if dropped now, where the ghost piece goes
+        """
+        block = self.block
+        return self.grid.landing(block.state, block.pos[0], block.pos[1])
+
+    def gravity(self, rows=1):
+        """
+        gravity (rows): moves the active block down up to rows rows or places it if it is already resting,
+        returns the number of rows cleared
+        """
+        block = self.block
+        y = self.landing()
+        if y > block.pos[1]:
+            block.pos[1] = min(y, block.pos[1] + rows)
+            return 0
+        return self.placeBlocks()
+
+    def placeBlocks(self):
+        """
+        placeBlocks (): places the active block, stores its collision data, updates score and swaps in the next block\n
+        returns: the number of rows cleared by the placement
+        """
+        block = self.block
+        if not self.grid.lock(block.state.masks, block.pos[0], block.pos[1]):
+            self.loose()
+            return 0
+        self.pieces += 1
+
+        if self.hard:
+            self.score += len(block.state.data)*2
+        else:
+            self.score += len(block.state.data)
+        #the pygame-only game never cleared this, so after its first hard drop every placement scored double
+        self.hard = False
+
+        self.block = self.nextBlock
+        self.nextBlock = self.newBlock()
+
+        return self.clearRows()
+
+    def clearRows(self):
+        """
+        clearRows (): removes full rows, shifts the stack down and scores them\n
+        returns: the number of rows cleared
+        """
+        m = self.grid.clearRows()
+        self.addLines(m)
+        return m
+
+    def addLines(self, m):
+        """
+        addLines (m): adds m cleared rows to the score, line count and speed
+        """
+        self.numLines += m
+        self.score += self.scoreTable.get(m, 0)
+
+        self.speedMult = speedFor(self.numLines)
+
+    def loose(self):
+        """
+        loose (): ends the game, reports the score to onLoose and starts a new one
+        """
+        score = self.score
+        self.games += 1
+
+        #kept for statistics after the reset
+        self.lastScore = score
+        self.lastLines = self.numLines
+        self.lastPieces = self.pieces
+
+        self.reset()
+        if self.onLoose:
+            self.onLoose(score)
+
+    def gravityInterval(self):
+        """
+        gravityInterval (): returns the time in ms between gravity ticks at the current speed
+        """
+        return self.gTime/self.speedMult/self.speedMult
+
+    def step(self, actions, dt):
+        """
+        step (actions, dt): advances the game by dt milliseconds\n
+        actions : sequence of "left", "right", "rotate", "drop", "speed" and "restart" applied in order, "speed" is held for this step only\n
+        returns: the number of rows cleared this step
+        """
+        self.gTime = 500
+        for action in actions:
+            if action == "left":
+                self.move(-1)
+            elif action == "right":
+                self.move(1)
+            elif action == "rotate":
+                self.rotate()
+            elif action == "drop":
+                self.drop()
+            elif action == "speed":
+                self.gTime = 100
+            elif action == "restart":
+                self.loose()
+
+        self.gravityTimer += dt
+        interval = self.gravityInterval()
+        if self.gravityTimer > interval:
+            #at speeds where several rows are due in one step they all fall at once
+            rows = max(1, int(self.gravityTimer // interval))
+            self.gravityTimer = 0
+            return self.gravity(rows)
+        return 0
+
+
+class Scheduler (object):
+    """
+    Scheduler (rate, maxSteps): fixed timestep clock for the simulation\n
+    rate     : simulation steps per second\n
+    maxSteps : most steps run for one advance, older backlog is dropped so a stall never snowballs\n
+    dt is the length of one step in ms
+    """
+    def __init__(self, rate=120, maxSteps=10):
+        self.dt = 1000/rate
+        self.maxSteps = maxSteps
+        self.reset()
+
+    def reset(self):
+        """
+        reset (): forgets the time already accumulated, call it when the simulation was paused
+        """
+        self.last = None
+        self.acc = 0
+
+    def advance(self, now):
+        """
+        advance (now): returns how many fixed steps are due at now (ms)
+        """
+        if self.last is None:
+            self.last = now
+        self.acc += now - self.last
+        self.last = now
+
+        n = int(self.acc // self.dt)
+        if n > self.maxSteps:
+            n = self.maxSteps
+            self.acc = 0
+        else:
+            self.acc -= n*self.dt
+        return n
@@ -0,0 +1,266 @@
+"""
+Gym style environments around TetrisEngine for reinforcement learning
+
+    env = TetrisEnv(mode="placement")
+    obs, info = env.reset(seed=1)
+    obs, reward, terminated, truncated, info = env.step(env.legalActions().argmax())
+
+Observations are a dict of NumPy arrays that are allocated once and overwritten by every reset and step,
+copy them if you need to keep one:
+    board  : (height, width) uint8, 1 where a block is placed
+    piece  : (4, 4) uint8, the active block in its current rotation from the top left
+    pieces : (4,) int32, active piece index, its rotation, next piece index, 0
+    pos    : (2,) int32, x and y of the active block
+    stats  : (4,) float64, score, lines, pieces placed and speedMult
+The reward is the score gained by the step.
+"""
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from engine import TetrisEngine
+from batch import cellArray
+from ai import pathTo
+
+#frame mode actions, one per step
+FRAME_ACTIONS = [[], ["left"], ["right"], ["rotate"], ["drop"], ["speed"]]
+
+
+def observationSpec(width, height):
+    """
+    observationSpec (width, height): returns [(name, shape, dtype)] of the observation arrays
+    """
+    return [
+        ("board", (height, width), np.uint8),
+        ("piece", (4, 4), np.uint8),
+        ("pieces", (4,), np.int32),
+        ("pos", (2,), np.int32),
+        ("stats", (4,), np.float64),
+    ]
+
+
+_shapes = {}
+
+def shapeArray(state):
+    """
+    shapeArray (state): returns the (4, 4) uint8 array of a RotationState, built once per state
+    """
+    shape = _shapes.get(state)
+    if shape is None:
+        shape = np.zeros((4, 4), np.uint8)
+        w,h = state.size
+        shape[:h, :w] = state.data
+        _shapes[state] = shape
+    return shape
+
+
+class TetrisEnv (object):
+    """
+    TetrisEnv (width, height, mode, bag, frameDt, maxSteps, buffers): one game with reset(seed) and step(action)\n
+    mode     : "frame" for one of FRAME_ACTIONS per step of frameDt ms,
+               "placement" for choosing where the active block goes, action = rotation*width + x\n
+    maxSteps : steps before an episode is truncated, None for never\n
+    buffers  : optional dict of arrays to write the observations into, shaped as observationSpec
+    """
+    def __init__(self, width=10, height=24, mode="frame", bag=False, frameDt=1000/60, maxSteps=None, buffers=None):
+        if mode not in ("frame", "placement"):
+            raise ValueError("mode is 'frame' or 'placement', not %r" % mode)
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.bag = bag
+        self.frameDt = frameDt
+        self.maxSteps = maxSteps
+        self.actionCount = len(FRAME_ACTIONS) if mode == "frame" else 4*width
+
+        if buffers is None:
+            buffers = dict((name, np.zeros(shape, dtype)) for name, shape, dtype in observationSpec(width, height))
+        self.obs = buffers
+        self.engine = None
+        self.version = None
+
+    def reset(self, seed=None):
+        """
+        reset (seed): starts a new game, the same seed deals the same pieces\n
+        returns: (obs, info)
+        """
+        self.engine = TetrisEngine(self.width, self.height, None, seed, self.bag)
+        self.steps = 0
+        self.version = None
+        self.observe()
+        return self.obs, {"seed": self.engine.seed}
+
+    def step(self, action):
+        """
+        step (action): plays one frame or one placement\n
+        returns: (obs, reward, terminated, truncated, info), terminated when the stack topped out
+        """
+        engine = self.engine
+        score = engine.score
+        games = engine.games
+
+        if self.mode == "frame":
+            engine.step(FRAME_ACTIONS[action], self.frameDt)
+        else:
+            rotation, x = divmod(int(action), self.width)
+            actions = pathTo(engine.grid, engine.block, rotation, x)
+            #one gravity tick past the hard drop places the block
+            engine.step(actions, engine.gravityInterval() + 1)
+        self.steps += 1
+
+        terminated = engine.games > games
+        if terminated:
+            reward = engine.lastScore - score
+            info = {"score": engine.lastScore, "lines": engine.lastLines, "pieces": engine.lastPieces}
+        else:
+            reward = engine.score - score
+            info = {}
+        truncated = not terminated and self.maxSteps is not None and self.steps >= self.maxSteps
+        self.observe()
+        return self.obs, reward, terminated, truncated, info
+
+    def legalActions(self):
+        """
+        legalActions (): returns a bool array over the placement actions, True where the block fits above the board
+        """
+        engine = self.engine
+        grid = engine.grid
+        legal = np.zeros(4*self.width, bool)
+        for rotation in range(4):
+            state = engine.block.states[rotation]
+            w,h = state.size
+            for x in range(self.width - w + 1):
+                legal[rotation*self.width + x] = grid.fits(state.masks, x, -h)
+        return legal
+
+    def observe(self):
+        """
+        observe (): writes the current game into the observation arrays
+        """
+        engine = self.engine
+        grid = engine.grid
+        obs = self.obs
+
+        #the board is only unpacked again when a block was placed
+        if grid.version != self.version or self.version is None:
+            self.version = grid.version
+            obs["board"][:] = cellArray(grid.rows, self.width)
+
+        block = engine.block
+        obs["piece"][:] = shapeArray(block.state)
+        obs["pieces"][:] = (block.piece, block.rotation, engine.nextBlock.piece, 0)
+        obs["pos"][:] = block.pos
+        obs["stats"][:] = (engine.score, engine.numLines, engine.pieces, engine.speedMult)
+
+
+#per environment values passed through shared memory next to the observations
+RESULTS = [
+    ("action", (), np.int64),
+    ("reward", (), np.float64),
+    ("done", (2,), np.bool_),
+]
+
+
+def _worker(pipe, names, index, kwargs):
+    memory = []
+    buffers = {}
+    width, height = kwargs.get("width", 10), kwargs.get("height", 24)
+    for name, shape, dtype in observationSpec(width, height) + RESULTS:
+        shm = shared_memory.SharedMemory(names[name])
+        memory.append(shm)
+        #a one element slice keeps even the scalar results a writable view
+        buffers[name] = np.ndarray((names["n"],) + shape, dtype, shm.buf)[index:index+1].reshape(shape)
+
+    env = TetrisEnv(buffers=dict((name, buffers[name]) for name, shape, dtype in observationSpec(width, height)), **kwargs)
+    try:
+        while True:
+            command, arg = pipe.recv()
+            if command == "reset":
+                env.reset(arg)
+            elif command == "step":
+                obs, reward, terminated, truncated, info = env.step(int(buffers["action"]))
+                buffers["reward"][...] = reward
+                buffers["done"][...] = (terminated, truncated)
+                if terminated or truncated:
+                    env.reset()
+            elif command == "close":
+                break
+            pipe.send(None)
+    finally:
+        #the arrays point into the shared memory, they have to go before it can be closed
+        del env, buffers
+        for shm in memory:
+            shm.close()
+
+
+class VectorEnv (object):
+    """
+    VectorEnv (n, **kwargs): n TetrisEnvs in worker processes, stepped together\n
+    kwargs are passed to every TetrisEnv\n
+    the observations live in shared memory as (n, ...) arrays the workers write into directly,
+    step only sends a one word command to each worker, nothing is pickled per step\n
+    an environment that terminates or is truncated starts its next episode on its own
+    """
+    def __init__(self, n, **kwargs):
+        self.n = n
+        width, height = kwargs.get("width", 10), kwargs.get("height", 24)
+        self.actionCount = len(FRAME_ACTIONS) if kwargs.get("mode", "frame") == "frame" else 4*width
+
+        self.memory = []
+        self.arrays = {}
+        names = {"n": n}
+        for name, shape, dtype in observationSpec(width, height) + RESULTS:
+            size = max(1, int(np.prod((n,) + shape))*np.dtype(dtype).itemsize)
+            shm = shared_memory.SharedMemory(create=True, size=size)
+            self.memory.append(shm)
+            names[name] = shm.name
+            self.arrays[name] = np.ndarray((n,) + shape, dtype, shm.buf)
+
+        self.obs = dict((name, self.arrays[name]) for name, shape, dtype in observationSpec(width, height))
+        self.pipes = []
+        self.workers = []
+        for i in range(n):
+            parent, child = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=_worker, args=(child, names, i, kwargs), daemon=True)
+            worker.start()
+            self.pipes.append(parent)
+            self.workers.append(worker)
+
+    def command(self, command, args):
+        for pipe, arg in zip(self.pipes, args):
+            pipe.send((command, arg))
+        for pipe in self.pipes:
+            pipe.recv()
+
+    def reset(self, seed=None):
+        """
+        reset (seed): starts new games, environment i gets seed + i\n
+        returns: (obs, info)
+        """
+        seeds = [None if seed is None else seed + i for i in range(self.n)]
+        self.command("reset", seeds)
+        return self.obs, {}
+
+    def step(self, actions):
+        """
+        step (actions): steps every environment with its action\n
+        returns: (obs, rewards, terminated, truncated, info), the arrays are views into shared memory
+        """
+        self.arrays["action"][:] = actions
+        self.command("step", [None]*self.n)
+        done = self.arrays["done"]
+        return self.obs, self.arrays["reward"], done[:, 0], done[:, 1], {}
+
+    def close(self):
+        if not self.pipes:
+            return
+        for pipe in self.pipes:
+            pipe.send(("close", None))
+        for worker in self.workers:
+            worker.join()
+        self.pipes = []
+        self.obs = self.arrays = None
+        for shm in self.memory:
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,172 @@
+"Cached surfaces for drawing blocks, the board and text"
+from collections import OrderedDict
+
+import pygame
+
+
+class SpriteAtlas (object):
+    """
+    SpriteAtlas (): pre-renders cell and piece surfaces once and hands out the same Surface afterwards\n
+    cells are keyed by (color, gridSize, borderLen) and pieces by (color, gridSize, borderLen, RotationState)\n
+    the returned surfaces are shared, blit them but never draw onto them
+    """
+    def __init__(self):
+        self.cells = {}
+        self.pieces = {}
+
+    def clear(self):
+        """
+        clear (): drops every cached surface, needed after the display mode changes
+        """
+        self.cells = {}
+        self.pieces = {}
+
+    def finish(self, surface):
+        """
+        finish (surface): converts surface to the display format when a display is open
+        """
+        if pygame.display.get_surface():
+            return surface.convert()
+        return surface
+
+    def cell(self, color, gridSize, borderLen):
+        """
+        cell (color, gridSize, borderLen): returns the Surface of a single grid cell
+        """
+        key = (color, gridSize, borderLen)
+        cube = self.cells.get(key)
+        if cube is None:
+            cube = pygame.Surface((gridSize,gridSize))
+            cube.fill((20,20,20))
+            cube.fill(color, (borderLen, borderLen, gridSize-(borderLen*2), gridSize-(borderLen*2)))
+            cube = self.finish(cube)
+            self.cells[key] = cube
+        return cube
+
+    def piece(self, color, gridSize, borderLen, state):
+        """
+        piece (color, gridSize, borderLen, state): returns the color keyed Surface of one piece orientation\n
+        state : a RotationState from the engine
+        """
+        key = (color, gridSize, borderLen, state)
+        surface = self.pieces.get(key)
+        if surface is None:
+            w,h = state.size
+            surface = pygame.Surface((w*gridSize, h*gridSize))
+
+            colorNew = (255 - color[0],255 - color[1],255 - color[2])
+            surface.fill(colorNew)
+
+            cube = self.cell(color, gridSize, borderLen)
+            surface.blits([(cube, (gridSize*x, gridSize*y)) for x,y in state.cells], False)
+
+            surface = self.finish(surface)
+            surface.set_colorkey(colorNew)
+            self.pieces[key] = surface
+        return surface
+
+    def drawBoard(self, surface, grid, color, gridSize, borderLen, offset=(0,0)):
+        """
+        drawBoard (surface, grid, color, gridSize, borderLen, offset): draws every placed cell of grid with one blits call\n
+        grid   : a Board\n
+        offset : (x,y) pixel position of the top left of the board on surface
+        """
+        cube = self.cell(color, gridSize, borderLen)
+        ox,oy = offset
+        sprites = []
+        y = oy
+        for row in grid.rows:
+            while row:
+                low = row & -row
+                sprites.append((cube, (ox + (low.bit_length()-1)*gridSize, y)))
+                row ^= low
+            y += gridSize
+        surface.blits(sprites, False)
+
+
+class TextCache (object):
+    """
+    TextCache (limit): resolves each (name, size, bold) font once and keeps the last limit rendered texts\n
+    limit : how many rendered Surfaces to keep before the least recently used one is dropped\n
+    the returned surfaces are shared, blit them but never draw onto them
+    """
+    def __init__(self, limit=256):
+        self.limit = limit
+        self.fonts = {}
+        self.texts = OrderedDict()
+
+    def font(self, name, size, bold=False):
+        """
+        font (name, size, bold): returns the pygame Font, looking up the system font only the first time
+        """
+        key = (name, size, bold)
+        f = self.fonts.get(key)
+        if f is None:
+            if name:
+                f = pygame.font.SysFont(name, size, bold)
+            else:
+                #what SysFont falls back to, without it scanning every installed font first
+                f = pygame.font.Font(None, size)
+                f.set_bold(bold)
+            self.fonts[key] = f
+        return f
+
+    def render(self, text, color, size, name="", bold=True):
+        """
+        render (text, color, size, name, bold): returns the antialiased Surface of text, rendering it only if it is not cached
+        """
+        key = (name, size, bold, text, color)
+        texts = self.texts
+        surface = texts.get(key)
+        if surface is None:
+            surface = self.font(name, size, bold).render(text, True, color)
+            texts[key] = surface
+            if len(texts) > self.limit:
+                texts.popitem(last=False)
+        else:
+            texts.move_to_end(key)
+        return surface
+
+
+atlas = SpriteAtlas()
+fonts = TextCache()
+
+
+class StackLayer (object):
+    """
+    StackLayer (size, background, color, gridSize, borderLen): a retained Surface of the placed blocks\n
+    size       : (w,h) of the board in pixels\n
+    background : (r,g,b) of empty cells\n
+    color      : (r,g,b) of placed cells\n
+    the Surface is only redrawn when the Board it shows changes, dirty is the pixel Rect the last update changed
+    """
+    def __init__(self, size, background, color, gridSize, borderLen):
+        self.surface = pygame.Surface(size)
+        self.background = background
+        self.color = color
+        self.gridSize = gridSize
+        self.borderLen = borderLen
+
+        self.grid = None
+        self.version = -1
+        self.dirty = self.surface.get_rect()
+
+    def invalidate(self):
+        """
+        invalidate (): forces a redraw on the next update
+        """
+        self.grid = None
+
+    def update(self, grid):
+        """
+        update (grid): redraws the layer if grid changed since the last call, returns True if it did\n
+        grid : a Board
+        """
+        if grid is self.grid and grid.version == self.version:
+            return False
+        self.grid = grid
+        self.version = grid.version
+
+        self.surface.fill(self.background)
+        atlas.drawBoard(self.surface, grid, self.color, self.gridSize, self.borderLen)
+        return True
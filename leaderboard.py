@@ -0,0 +1,140 @@
+"Local leaderboard of every finished game in SQLite, written on a background thread"
+import queue
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    id      INTEGER PRIMARY KEY,
+    player  TEXT NOT NULL,
+    score   INTEGER NOT NULL,
+    lines   INTEGER NOT NULL,
+    pieces  INTEGER NOT NULL,
+    date    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scores_score ON scores (score DESC, id);
+CREATE INDEX IF NOT EXISTS scores_date ON scores (date);
+CREATE INDEX IF NOT EXISTS scores_player ON scores (player, score DESC, id);
+"""
+
+COLUMNS = "id, player, score, lines, pieces, date"
+
+
+class Leaderboard (object):
+    """
+    Leaderboard (path, batch): scores table in the SQLite file at path\n
+    batch : most games written in one transaction\n
+    add() only queues the game, a writer thread with its own connection does the inserts so the game loop
+    never waits on the disk, the queries run on the calling thread and only ever read one page through the indexes
+    """
+    def __init__(self, path, batch=64):
+        self.path = path
+        self.batch = batch
+
+        self.db = self.connect()
+        self.db.executescript(SCHEMA)
+        self.db.commit()
+
+        self.pending = queue.Queue()
+        self.writer = threading.Thread(target=self.write, name="leaderboard", daemon=True)
+        self.writer.start()
+
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        #readers are not blocked while the writer thread commits
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def add(self, player, score, lines=0, pieces=0, date=None):
+        """
+        add (player, score, lines, pieces, date): queues a finished game, date defaults to now (seconds since the epoch)
+        """
+        self.pending.put((player, score, lines, pieces, time.time() if date is None else date))
+
+    def write(self):
+        db = self.connect()
+        while True:
+            rows = [self.pending.get()]
+            #whatever else is already waiting goes in the same transaction
+            while len(rows) < self.batch:
+                try:
+                    rows.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in rows
+            rows = [r for r in rows if r is not None]
+            if rows:
+                with db:
+                    db.executemany("INSERT INTO scores (player, score, lines, pieces, date) VALUES (?, ?, ?, ?, ?)", rows)
+            for i in range(len(rows) + stop):
+                self.pending.task_done()
+            if stop:
+                db.close()
+                return
+
+    def flush(self):
+        """
+        flush (): waits until every queued game is written
+        """
+        self.pending.join()
+
+    def close(self):
+        """
+        close (): writes the queued games and stops the writer thread
+        """
+        if self.writer.is_alive():
+            self.pending.put(None)
+            self.writer.join()
+        self.db.close()
+
+    def page(self, limit=10, after=None, player=None):
+        """
+        page (limit, after, player): returns up to limit rows (id, player, score, lines, pieces, date), best score first\n
+        after  : the last row of the previous page, the page starts right after it\n
+        player : only this player's games\n
+        pages are found by seeking the score index to after instead of skipping rows, so page 1000 costs the same as page 1
+        """
+        where = []
+        args = []
+        if player is not None:
+            where.append("player = ?")
+            args.append(player)
+        if after is not None:
+            where.append("(score < ? OR (score = ? AND id > ?))")
+            args += [after[2], after[2], after[0]]
+
+        sql = "SELECT " + COLUMNS + " FROM scores"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY score DESC, id LIMIT ?"
+        args.append(limit)
+        return self.db.execute(sql, args).fetchall()
+
+    def top(self, n=10, player=None):
+        """
+        top (n, player): returns the n best games, of one player if given
+        """
+        return self.page(n, player=player)
+
+    def best(self, player=None):
+        """
+        best (player): returns the best score, of one player if given, 0 if there are no games
+        """
+        rows = self.page(1, player=player)
+        return rows[0][2] if rows else 0
+
+    def recent(self, n=10, player=None):
+        """
+        recent (n, player): returns the n latest games, of one player if given
+        """
+        sql = "SELECT " + COLUMNS + " FROM scores"
+        args = []
+        if player is not None:
+            sql += " WHERE player = ?"
+            args.append(player)
+        sql += " ORDER BY date DESC LIMIT ?"
+        args.append(n)
+        return self.db.execute(sql, args).fetchall()
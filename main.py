@@ -1,156 +1,20 @@
 import os
 import sys
+import time
+import atexit
 import pygame
 from pygame.locals import *
-from random import randint
 import ast
 
-class Block (object):
-    """
-    Block (data,color,pos): handles block graphics and position\n
-    data  : a 2D aray with 1's & 0's (1=block) or "random" for random generation\n
-    color : (r,g,b)\n
-    pos   : [x,y] where to render the block (from top left)\n
-    """
-    def __init__(self,data, color, pos):
-        self.color = color
-        self.pos = pos
-
-        if data == "random":
-            self.data = self.randomData()
-        else:
-            self.data = data
-
-        self.size = [len(self.data[0]), len(self.data)]
-    
-    def draw(self, gridSize, borderLen):
-        """
-        draw (gridSize, borderLen): returns a Surface of the specified block\n
-        gridSize  : the global grid size for the game (int)\n
-        borderLen : the width of the border between individual grids (int)\n
-        """
-        data = self.data
-        self.size = [len(data[0]), len(data)]
-
-        cube = pygame.Surface((gridSize,gridSize))
-        cubeC = pygame.Surface((gridSize-(borderLen*2),gridSize-(borderLen*2)))
-        cubeC.fill(self.color)
-        cube.fill((20,20,20))
-        cube.blit(cubeC, (borderLen, borderLen))
-
-        surface = pygame.Surface((self.size[0]*gridSize, self.size[1]*gridSize))
-
-
-        colorNew = (255 - self.color[0],255 - self.color[1],255 - self.color[2])
-        surface.fill(colorNew)
-        
-        for y in range(self.size[1]):
-            for x in range(self.size[0]):
-                val = data[y][x]
-                if val == 1:
-                    surface.blit(cube,(gridSize*x, gridSize*y))
-        surface.set_colorkey(colorNew)
-        return surface
-    
-    def getAbsPos(self, grid):
-        """
-        getAbsPos (grid): returns the position of each individual block in a Block on the grid\n
-        grid : grid data ex| 18x18 full of zeros
-        """
-        pos = []
-        for y in range(self.size[1]):
-            for x in range(self.size[0]):
-                if self.data[y][x] == 1:
-                    x1 = self.pos[0] + x
-                    y1 = self.pos[1] + y
-                    pos.append((x1,y1))
-                else:
-                    pos.append(None)
-        return pos
-
-    def randomData(self):
-        datas = [
-            [[1,1,1,1]],
-            [[1,0,0],[1,1,1]],
-            [[0,0,1],[1,1,1]],
-            [[1,1],[1,1]],
-            [[0,1,1],[1,1,0]],
-            [[0,1,0],[1,1,1]],
-            [[1,1,0],[0,1,1]],
-        ] #all posible cominations
-
-        x = len(datas)
-        x = randint(0,x-1)
-        return datas[x]
-
-    def rotate(self, grid):
-        w,h = self.size
-
-        newData = []        
-        for x in range(w):
-            t = []
-            for y in range(h):
-                t.append(self.data[y][x])
-            t = t[::-1]
-            newData.append(t)
-        data = self.data
-        self.data = newData
-        self.size = (h,w)
-
-        x1,y1 = self.pos
-        x = w-h
-        if x != 0:
-            k = x 
-            p=x
-            if k < 0: k = k*-1
-        
-            u=0
-            if x == 3: u = 1
-            elif x == -3: u = -1
-
-            n = int(x/k)
-            self.pos = [self.pos[0] + n, self.pos[1] + u]
-
-        badPosition = False
-        positions = self.getAbsPos(grid)
-        for pos in positions:
-            if pos:
-                x,y = pos
-                try:
-                    if grid[y][x] == 1:
-                        badPosition = True
-                except:
-                    badPosition = True
-                if x < 0:
-                    badPosition = True
-
-        if badPosition:
-            self.data = data
-            self.size = (w,h)
-            self.pos = [x1,y1]
-
-    def floor(self, grid):
-
-        x,y = self.pos
-        touch = False
-        while not touch:
-            if self.pos[1] + self.size[1] < len(grid):
-                positions = self.getAbsPos(grid)
-                for pos in positions:
-                    if pos:
-                        dwn = (pos[0], pos[1] + 1)
-                        try:
-                            if grid[dwn[1]][dwn[0]] == 1:
-                                if dwn[0] >= 0 and dwn[1] >= 0:
-                                    touch = True
-                        except:
-                            pass
-
-            else: #touching bottom
-                touch = True
-            self.pos[1] += 1
-        self.pos[1] -= 1
-
+from engine import TetrisEngine, Scheduler
+from graphics import StackLayer, atlas, fonts
+from assets import assets, find_data_file
+from controls import Controls
+from ai import AutoPlayer
+from replay import Recorder
+from profiler import FrameProfiler
+from leaderboard import Leaderboard
+from savegame import Autosaver
 
 class Button():
     """
@@ -171,20 +35,17 @@ class Button():
         self.action = action
         self.args = args
 
+        #both looks of the button are composited once up front
+        for image in self.images:
+            assets.button(image, self.text, self.color)
+
         self.Surface = self.draw()
 
         if centered:
             self.pos = self.getCenter()
 
     def draw(self):
-        f = pygame.font.SysFont("", 40, True)
-
-
-        img = pygame.image.load(find_data_file(self.activeImage))
-        text = f.render(self.text, True, self.color)
-        img.blit(text, (img.get_width()/2 - text.get_width()/2, img.get_height()/2 - text.get_height()/2))
-
-        return img
+        return assets.button(self.activeImage, self.text, self.color)
 
     def tick(self):
         if pygame.mouse.get_pressed()[0]:
@@ -250,8 +111,6 @@ class textInput():
         self.Surface = self.draw()
         self.state = 0
 
-        self.blinkIter = 0
-
         self.id = id
 
     def draw(self):
@@ -259,8 +118,7 @@ class textInput():
         if self.text == "":
             text = self.savedText
 
-        f = pygame.font.SysFont("", self.size, True)
-        text = f.render(text, True, self.color)
+        text = fonts.render(text, self.color, self.size)
 
         if self.text == "":
             box = pygame.Surface((text.get_width(), text.get_height()), pygame.SRCALPHA)
@@ -268,43 +126,15 @@ class textInput():
 
             bar = pygame.Surface((text.get_width(), 2))
 
-            dur = 60
-
-            if self.blinkIter <= dur:
+            #blinks once a second whatever the frame rate
+            if pygame.time.get_ticks() % 1000 < 500:
                 box.blit(bar, (0, text.get_width()))
-            elif self.blinkIter > dur*2:
-                self.blinkIter = 0
-            
-            self.blinkIter += 1
 
             text = box
 
         self.Surface = text
         return text
 
-    def getKeys(self):
-        """
-        getkeys (): returns a list of all the keys currently being pressed
-        """
-        current_keys = {'a': 97, 'b': 98, 'c': 99, 'd': 100, 'e': 101, 'f': 102, 'g': 103, 'h': 104, 'i': 105, 'j': 106, 'k': 107, 'l': 108, 'm': 109,
-        'n': 110, 'o': 111, 'p': 112, 'q': 113, 'r': 114, 's': 115, 't': 116, 'u': 117, 'v': 118, 'w': 119, 'x': 120, 'y': 121, 'z': 122, '[': 91, ']': 93, '\\': 92, '.': 46, '/': 47, ';': 59, "'": 39, 'backspace': 8, 'delete': 127, 'home': 278, 'end': 279, 'return': 13, 'insert': 277, 'page up': 280, 'right shift': 303, 'up': 273, 'page down': 281, 'right': 275, 'down': 274, 'left': 276,
-        'right ctrl': 305, 'menu': 319, 'right alt': 307, 'space': 32, 'left alt': 308, 'left ctrl': 306, 'left shift': 304, 'caps lock': 301, 'tab': 301, '`': 301, '1': 301, '2': 301, '3': 301, '4':
-        301, '5': 301, '6': 301, '7': 301, '8': 301, '9': 301, '0': 301, '-': 301, '=': 301, 'escape': 301, 'f1': 301, 'f2': 301, 'f3':
-        301, 'f4': 301, 'f5': 301, 'f6': 287, 'f7': 301, 'f8': 301, 'f9': 301, 'f10': 301, 'f11': 301, 'f12': 301, '0': 48, '1': 49, '2': 50, '3': 51, '4': 52, '5': 53, '6': 54, '7': 55, '8': 56, '9': 57}
-        
-        if pygame.key.get_focused() == True:
-            bools = pygame.key.get_pressed()
-            out = []
-            for i in range(0,len(bools)):
-                if bools[i] == 1:
-                    try:
-                        out.append(list(current_keys.keys())[list(current_keys.values()).index(i)])
-                    except(ValueError):
-                        pass
-            return out
-        return []
-
-
     def tick(self):
         hit = self.Surface.get_rect(center=self.pos).collidepoint(pygame.mouse.get_pos())
         pressed = pygame.mouse.get_pressed()[0]
@@ -321,7 +151,7 @@ class textInput():
                 self.state = 0
 
         if self.state == 1:
-            keys = self.getKeys()
+            keys = controls.typed
             if keys:
                 self.text = keys[0]
                 self.savedText = self.text
@@ -340,437 +170,581 @@ class textInput():
 
 
 
-def find_data_file(filename):
-    """
-    find_data_file (filename) : Finds the absolute position of a file for when the game is compiled into an exe
-    filename : string including for filename "example.txt"
+class GameScreen (object):
     """
-    if getattr(sys, 'frozen', False):
-        # The application is frozen
-        datadir = os.path.dirname(sys.executable)
-    else:
-        # The application is not frozen
-        # Change this bit to match where you store your data files:
-        datadir = os.path.dirname(__file__)
-
-    return os.path.join(datadir, filename)
-
-def getKeys():
+    GameScreen (screen, display, engine, scheduler, step): runs and draws game mode\n
+    screen    : the window Surface, the right panel is drawn here\n
+    display   : the Surface the board is drawn on before it goes on the screen\n
+    engine    : the TetrisEngine being played\n
+    scheduler : the Scheduler giving the fixed simulation steps\n
+    step      : optional function used instead of engine.step (to record replays)\n
+    profiler  : optional FrameProfiler timing each phase of the frame
     """
-    getkeys (): returns a list of all the keys currently being pressed
-    """
-    current_keys = {'a': 97, 'b': 98, 'c': 99, 'd': 100, 'e': 101, 'f': 102, 'g': 103, 'h': 104, 'i': 105, 'j': 106, 'k': 107, 'l': 108, 'm': 109,
-    'n': 110, 'o': 111, 'p': 112, 'q': 113, 'r': 114, 's': 115, 't': 116, 'u': 117, 'v': 118, 'w': 119, 'x': 120, 'y': 121, 'z': 122, '[': 91, ']': 93, '\\': 92, '.': 46, '/': 47, ';': 59, "'": 39, 'backspace': 8, 'delete': 127, 'home': 278, 'end': 279, 'return': 13, 'insert': 277, 'page up': 280, 'right shift': 303, 'up': 273, 'page down': 281, 'right': 275, 'down': 274, 'left': 276,
-    'right ctrl': 305, 'menu': 319, 'right alt': 307, 'space': 32, 'left alt': 308, 'left ctrl': 306, 'left shift': 304, 'caps lock': 301, 'tab': 301, '`': 301, '1': 301, '2': 301, '3': 301, '4':
-    301, '5': 301, '6': 301, '7': 301, '8': 301, '9': 301, '0': 301, '-': 301, '=': 301, 'escape': 301, 'f1': 301, 'f2': 301, 'f3':
-    301, 'f4': 301, 'f5': 301, 'f6': 287, 'f7': 301, 'f8': 301, 'f9': 301, 'f10': 301, 'f11': 301, 'f12': 301, '0': 48, '1': 49, '2': 50, '3': 51, '4': 52, '5': 53, '6': 54, '7': 55, '8': 56, '9': 57}
-    
-    if pygame.key.get_focused() == True:
-        bools = pygame.key.get_pressed()
-        out = []
-        for i in range(0,len(bools)):
-            if bools[i] == 1:
-                try:
-                    out.append(list(current_keys.keys())[list(current_keys.values()).index(i)])
-                except(ValueError):
-                    pass
-        return out
-    return []
-
-def placeBlocks(block, NextBlock):
-    """
-    placeBlocks (block): places block on the screen, removes player control from the block and stores its collision data (updates score too)\n
-    block : a Block object\n
-    returns: a new block for the player to control
-    """
-    global grid
-    global gridW
-    global hard
-    global score
-
-    positions = block.getAbsPos(grid)
-
-    for pos in positions:
-        if pos:
-            grid[pos[1]][pos[0]] = 1
-
-            if pos[1] <= 0:
-                loose()
-
-    if hard:
-        score += len(block.data)*2
-    else:
-        score += len(block.data)
-
-    data = "random"
-    block = Block(data, (200,200,200), [0,0])
-    data = block.data
-    pos = [randint(0, size[0]/gridW - len(data[0])), 0-len(data)]
-    block.pos = pos
-    return NextBlock, block
-
-def loose():
-    global grid
-    global block
-    global score
-    global highScore
-    global numLines
-    global speedMult
-
-    grid = []
-    w = int(size[0]/gridW)
-    h = int(size[1]/gridW)
-
-    for y in range(h):
-        temp = []
-        for x in range(w):
-            temp.append(0)
-        grid.append(temp)
-        temp = []
-    
-    data = "random"
-    block = Block(data, (200,200,200), [0,0])
-    data = block.data
-    pos = [randint(0, size[0]/gridW - len(data[0])), 0-len(data)]
-    block.pos = pos
-
-    if score > highScore:
-        highScore = score
-        f = open(find_data_file("hs.txt"), "w")
-        f.write(str(highScore))
-    score = 0
-    numLines = 0
-    speedMult = 1
-
-def menu(arg):
-    global mode
-    if arg == "exit":
-        sys.exit()
-    elif arg == "start":
-        mode = "game"
-    elif arg == "settings":
-        mode = "settings"
-
-def settingsMenu(arg):
-    global mode
-    if arg == "back":
-        mode = "menu"
-        print(settings)
-
-        f = open(find_data_file("settings.txt"), "w")
-        f.write(str(settings))
-
-pygame.init()
-
-size = (300,720)
-gridW = 30
-panelSize = 300
+    def __init__(self, screen, display, engine, scheduler, step=None, profiler=None):
+        self.screen = screen
+        self.display = display
+        self.engine = engine
+        self.scheduler = scheduler
+        self.step = step or engine.step
+        #plans on the frame thread, lookahead costs tens of ms per block on 10x24 and seconds on big boards
+        self.bot = AutoPlayer(engine, lookahead=False)
+
+        #retained layer of placed blocks and the areas redrawn last frame,
+        #the NumPy renderer only redraws the rows that changed which pays off on big boards
+        layer = StackLayer
+        if settings.get("renderer") == "array":
+            from pixels import ArrayLayer as layer
+        self.stack = layer(size, (22,22,22), (200,200,200), gridW, border)
+        self.panelRect = pygame.Rect(size[0], 0, panelSize, windowH)
+        self.pieceRect = None
+        self.ghostRect = None
+        self.lastPanel = None
+
+        self.restartBtn = Button(["b.png", "bP.png"], "RESTART", (222,222,222), (size[0] + panelSize/2, 400), self.restart)
+        self.armed = True
+        self.restartBtn.pos = self.restartBtn.getCenter()
+
+        self.profiler = profiler
+        self.overlayRect = pygame.Rect(size[0] + 20, 470, panelSize - 40, 170)
+        if profiler:
+            #row clears run inside gravity, they get a phase of their own
+            engine.clearRows = profiler.timed(engine.clearRows, "rows")
+
+    def restart(self):
+        """
+        restart (): ends the current game, once per click
+        """
+        #buttons fire every frame they are held, like ScoresScreen.turn
+        if not self.armed:
+            return
+        self.armed = False
+        loose()
 
-w = int(size[0]/gridW)
-h = int(size[1]/gridW)
+    def mark(self, phase):
+        if self.profiler:
+            self.profiler.mark(phase)
 
-grid = []
-for y in range(h):
-    temp = []
-    for x in range(w):
-        temp.append(0)
-    grid.append(temp)
-    temp = []
+    def toggleProfiler(self):
+        """
+        toggleProfiler (): shows or hides the timing overlay in the right panel
+        """
+        if self.profiler:
+            self.profiler.toggle()
+            self.lastPanel = None
 
+    def pause(self):
+        """
+        pause (): called on frames spent in other modes so no time or input piles up
+        """
+        self.scheduler.reset()
+        controls.clear()
 
-# makes two Surfaces one as the screen the other as a mimic screen
-# this is useful for post-process scaling
-screen = pygame.display.set_mode((size[0] + panelSize,720))
-display = pygame.Surface(size)
-display.fill((22,22,22))
-screen.fill((222,222,222))
-screen.blit(display,(0,0))
-pygame.display.flip()
+    def simulate(self, now):
+        """
+        simulate (now): user input, gravity, row clears and scoring for the steps due at now (ms)
+        """
+        steps = self.scheduler.advance(now)
+        if steps:
+            actions = controls.actions(now)
+            autoplay = settings.get("autoplay")
+            if autoplay:
+                actions = []
+            actions = requested + actions
+            del requested[:]
+            self.mark("input")
+
+            for i in range(steps):
+                #the bot plans on every step, at high gravity a block can spawn and land within one frame
+                if autoplay:
+                    actions = actions + self.bot.actions()
+                self.step(actions, self.scheduler.dt)
+                actions = ["speed"] if "speed" in actions else []
+        self.mark("gravity")
+
+    def draw(self, redraw):
+        """
+        draw (redraw): draws what changed since the last frame, everything if redraw\n
+        returns: the list of screen rects that changed
+        """
+        engine = self.engine
+        display = self.display
+        screen = self.screen
+        stack = self.stack
+        rects = []
 
-pygame.display.set_caption('Tetris')
+        #LEFT SIDE OF SCREEN
+        block = engine.block
+
+        #the placed blocks are only redrawn when they change, otherwise
+        #the last position of the active block is restored from the stack layer
+        if stack.update(engine.grid) or redraw:
+            dirty = display.get_rect() if redraw else stack.dirty
+            display.blit(stack.surface, dirty, dirty)
+            rects.append(dirty)
+        for r in (self.pieceRect, self.ghostRect):
+            if r:
+                display.blit(stack.surface, r, r)
+                rects.append(r)
+
+        #draws where the active block would land if dropped, under the block itself
+        self.ghostRect = None
+        if settings.get("ghost", 1):
+            ghost = atlas.piece((60,60,60), gridW, border, block.state)
+            self.ghostRect = display.blit(ghost, (block.pos[0]*gridW, engine.landing()*gridW))
+            rects.append(self.ghostRect)
 
-#creates the first block
-data = "random"
-block = Block(data, (200,200,200), [0,0])
-data = block.data
-pos = [randint(0, size[0]/gridW - len(data[0])), 0-len(data)]
-block.pos = pos
+        #draws active block
+        b = block.draw(gridW, border)
+        self.pieceRect = display.blit(b, (block.pos[0]*gridW, block.pos[1]*gridW))
+        rects.append(self.pieceRect)
 
-data = "random"
-nextBlock = Block(data, (200,200,200), [0,0])
-data = nextBlock.data
-pos = [randint(0, size[0]/gridW - len(data[0])), 0-len(data)]
-nextBlock.pos = pos
+        for r in rects:
+            screen.blit(display, r, r)
+        self.mark("stack")
 
-#timers for controled movement
-lastTime = 0  #user Controls
-lastTime2 = 0 #down
-gTime = 500
+        #RIGHT SIDE OF SCREEN
+        restartBtn = self.restartBtn
+        panel = (engine.score, highScore, engine.nextBlock.state, restartBtn.activeImage)
+        if panel != self.lastPanel or redraw:
+            self.lastPanel = panel
+            screen.fill((222,222,222), self.panelRect)
 
-speedMult = 1
+            sc = fonts.render(str(engine.score), (22,22,22), 60)
+            w = sc.get_width()
 
-#keeps tracks of whoch keys were pushed in order to implemet one action for push
-pushedKeys = []
+            Highsc = fonts.render(str(highScore), (22,22,22), 60)
+            w2 = Highsc.get_width()
+            h2 = Highsc.get_height()
 
-#scoring
-hard = False    #wether or not a block was hard dropped
-score = 0
+            screen.blit(sc, (size[0] + panelSize/2 -w/2, 20))
+            screen.blit(Highsc, (size[0] + panelSize/2 -w2/2, windowH-20-h2))
 
-f = open(find_data_file("hs.txt"), "r")
-highScore = int(f.read())
-f.close()
+            screen.blit(restartBtn.draw(), restartBtn.pos)
 
-numLines = 0
+            nb = engine.nextBlock.draw(30, 2)
+            screen.blit(nb, (size[0] + panelSize/2 -nb.get_width()/2, 200))
 
+            rects.append(self.panelRect)
+            redraw = True
 
-f = open(find_data_file("settings.txt"))
-r = f.read()
+        profiler = self.profiler
+        if profiler and profiler.visible and (profiler.due(pygame.time.get_ticks()) or redraw):
+            rects.append(profiler.draw(screen, self.overlayRect, (222,222,222), (22,22,22)))
 
-settings = ast.literal_eval(r)
-print(settings)
+        if not pygame.mouse.get_pressed()[0]:
+            self.armed = True
+        restartBtn.tick()
+        self.mark("hud")
+        return rects
 
-restartBtn = Button(["b.png", "bP.png"], "RESTART", (222,222,222), (3/2*panelSize, 400), loose)
-restartBtn.pos = restartBtn.getCenter()
+    def frame(self, now, redraw=False):
+        """
+        frame (now, redraw): simulates and draws one frame of game mode and pushes the changed rects to the window
+        """
+        self.simulate(now)
+        rects = self.draw(redraw)
 
-startBtn = Button(["b.png", "bP.png"], "START", (222,222,222), (3/2*panelSize, 100), menu, "start", centered=True)
-settingsBtn = Button(["b.png", "bP.png"], "SETTINGS", (222,222,222), (3/2*panelSize, 300), menu, "settings", centered=True)
-ScoresBtn = Button(["b.png", "bP.png"], "SCORES", (222,222,222), (3/2*panelSize, 200), menu, "scores", centered=True)
-ExitBtn = Button(["b.png", "bP.png"], "EXIT", (222,222,222), (3/2*panelSize, 400), menu, "exit", centered=True)
+        #refreshes only the parts of the screen that changed
+        pygame.display.update(rects)
+        if self.profiler:
+            self.profiler.mark("flip")
+            self.profiler.end()
 
-logo = pygame.image.load("logo.png")
+class ScoresScreen (object):
+    """
+    ScoresScreen (screen, display, leaderboard, perPage): pages through the leaderboard in scores mode\n
+    only the page on screen is ever read from the leaderboard, and only when it changes
+    """
+    def __init__(self, screen, display, leaderboard, perPage=14):
+        self.screen = screen
+        self.display = display
+        self.leaderboard = leaderboard
+        self.perPage = perPage
+        self.armed = True
+
+        self.prevBtn = Button(["b.png", "bP.png"], "PREV", (222,222,222), (size[0] + panelSize/2, 100), self.turn, -1, centered=True)
+        self.nextBtn = Button(["b.png", "bP.png"], "NEXT", (222,222,222), (size[0] + panelSize/2, 200), self.turn, 1, centered=True)
+        self.backBtn = Button(["b.png", "bP.png"], "BACK", (222,222,222), (size[0] + panelSize/2, 600), menu, "menu", centered=True)
+        self.mine = toggleButton(["c.png", "cP.png"], "", (222,222,222), (size[0] + panelSize/2 + 60, 310), centered=True)
+        self.reset()
+
+    def reset(self):
+        """
+        reset (): goes back to the first page, call it when the scores may have changed
+        """
+        self.starts = [None]    #the row each page seen so far starts after
+        self.rows = None
+        self.player = None
+
+    def load(self):
+        player = settings.get("name", "PLAYER") if self.mine.state else None
+        if self.rows is None or player != self.player:
+            if player != self.player:
+                self.starts = [None]
+            self.player = player
+            #one row more than fits tells if there is a next page
+            self.rows = self.leaderboard.page(self.perPage + 1, self.starts[-1], player)
+        return self.rows[:self.perPage]
+
+    def turn(self, direction):
+        """
+        turn (direction): shows the next page if direction is 1, the previous one if -1
+        """
+        #buttons fire every frame they are held, one click turns one page
+        if not self.armed:
+            return
+        self.armed = False
+
+        if direction > 0 and self.rows and len(self.rows) > self.perPage:
+            self.starts.append(self.rows[self.perPage - 1])
+            self.rows = None
+        elif direction < 0 and len(self.starts) > 1:
+            self.starts.pop()
+            self.rows = None
 
-menuBtns = [startBtn, settingsBtn, ScoresBtn, ExitBtn]
+    def draw(self):
+        """
+        draw (): draws the scores mode, the caller flips the display
+        """
+        display = self.display
+        screen = self.screen
+        if not pygame.mouse.get_pressed()[0]:
+            self.armed = True
 
-backBtn = Button(["b.png", "bP.png"], "BACK", (222,222,222), (3/2*panelSize, 600), settingsMenu, "back", centered=True)
-showGrid = toggleButton(["c.png", "cP.png"], "", (222,222,222), (3/2*panelSize + 60, 410), centered=True)
-leftIn = textInput(40, settings["left"], (22,22,22), (7/4*panelSize - 20,50))
-RightIn = textInput(40, settings["right"], (22,22,22), (7/4*panelSize - 20,50))
-SpeedIn = textInput(40, settings["speed"], (22,22,22), (7/4*panelSize - 20,50))
-DropIn = textInput(40, settings["drop"], (22,22,22), (7/4*panelSize - 20,50))
-RotateIn = textInput(40, settings["rotate"], (22,22,22), (7/4*panelSize - 20,50))
+        for btn in (self.prevBtn, self.nextBtn, self.backBtn, self.mine):
+            btn.tick()
+            screen.blit(btn.draw(), btn.pos)
+        screen.blit(fonts.render("Mine: ", (22,22,22), 35), (size[0]+15, 300))
+
+        rows = self.load()
+        title = fonts.render("SCORES", (200,200,200), 50)
+        display.blit(title, (size[0]/2 - title.get_width()/2, 20))
+
+        y = 90
+        rank = (len(self.starts) - 1)*self.perPage + 1
+        for row in rows:
+            name = fonts.render("%d. %s" % (rank, row[1][:10]), (200,200,200), 28, bold=False)
+            score = fonts.render(str(row[2]), (200,200,200), 28)
+            display.blit(name, (15, y))
+            display.blit(score, (size[0] - 15 - score.get_width(), y))
+            y += 42
+            rank += 1
+
+        if not rows:
+            empty = fonts.render("no games yet", (120,120,120), 28, bold=False)
+            display.blit(empty, (size[0]/2 - empty.get_width()/2, y))
+
+        page = fonts.render("page %d" % len(self.starts), (120,120,120), 24, bold=False)
+        display.blit(page, (size[0]/2 - page.get_width()/2, size[1] - 40))
+
+class SettingsScreen (object):
+    """
+    SettingsScreen (screen): key bindings and toggles in settings mode, edits settings in place
+    """
+    def __init__(self, screen):
+        self.screen = screen
 
-inputs = []
+        self.backBtn = Button(["b.png", "bP.png"], "BACK", (222,222,222), (size[0] + panelSize/2, 600), settingsMenu, "back", centered=True)
+        self.showGrid = toggleButton(["c.png", "cP.png"], "", (222,222,222), (size[0] + panelSize/2 + 60, 410), centered=True)
+        self.autoPlay = toggleButton(["c.png", "cP.png"], "", (222,222,222), (size[0] + panelSize/2 + 60, 490), centered=True)
+        self.autoPlay.state = settings.get("autoplay", 0)
+        self.autoPlay.activeImage = self.autoPlay.images[self.autoPlay.state]
 
-x = 50
-for i in ["left", "right", "speed", "drop", "rotate"]:
-    inputs.append(textInput(40, settings[i], (22,22,22), (7/4*panelSize - 20,x), i))
-    x += 50
+        self.inputs = []
 
-mode = "menu"
+        x = 50
+        for i in ["left", "right", "speed", "drop", "rotate"]:
+            self.inputs.append(textInput(40, settings[i], (22,22,22), (size[0] + 3/4*panelSize - 20,x), i))
+            x += 50
 
+    def draw(self):
+        """
+        draw (): draws the settings mode and copies the inputs into settings, the caller flips the display
+        """
+        screen = self.screen
 
+        GRD = fonts.render("Show Grid: ", (22,22,22), 35)
 
+        screen.blit(GRD, (size[0]+15, 400))
 
-while True:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            sys.exit()
+        AUT = fonts.render("Autoplay: ", (22,22,22), 35)
 
-    if mode == "game":
-        #LEFT SIDE OF SCREEN
+        screen.blit(AUT, (size[0]+15, 480))
 
-        #draws active block
-        b = block.draw(gridW, 2)
-        display.blit(b, (block.pos[0]*gridW, block.pos[1]*gridW))
+        for btn in (self.backBtn, self.showGrid, self.autoPlay):
+            btn.tick()
+            screen.blit(btn.draw(), btn.pos)
 
-        #draws inactive blocks
-        for y in range(len(grid)):
-            for x in range(len(grid[0])):
-                if grid[y][x] == 1:
-                    b = Block([[1]], (200,200,200), [x,y])
-                    w,h = b.pos
-                    display.blit(b.draw(gridW, 2), (w*gridW,h*gridW))
+        for i in self.inputs:
 
-        #RIGHT SIDE OF SCREEN
+            t = fonts.render(i.id, (22,22,22), 35)
 
-        f = pygame.font.SysFont("", 60, True)
-        sc = f.render(str(score), True, (22,22,22))
-        w = sc.get_width()
+            screen.blit(t, (size[0]+15, i.getCenter()[1]))
 
-        Highsc = f.render(str(highScore), True, (22,22,22))
-        w2 = Highsc.get_width()
-        h2 = Highsc.get_height()
+            screen.blit(i.draw(), i.getCenter())
+            i.tick()
 
-        screen.blit(sc, (size[0] + panelSize/2 -w/2, 20))
-        screen.blit(Highsc, (size[0] + panelSize/2 -w2/2, size[1]-20-h2))
+            settings[i.id] = i.savedText
 
-        screen.blit(restartBtn.draw(), restartBtn.pos)
-        restartBtn.tick()
+        settings["grid"] = self.showGrid.state
+        settings["autoplay"] = self.autoPlay.state
 
-        nb = nextBlock.draw(gridW, 2)
-        screen.blit(nb, (size[0] + panelSize/2 -nb.get_width()/2, 200))
+def loose():
+    """
+    loose (): ends the current game on the next step, the engine reports the score to saveHighScore\n
+    it goes through the engine's actions so recorded replays see it
+    """
+    requested.append("restart")
 
+def saveHighScore(score):
+    """
+    saveHighScore (score): adds the finished game to the leaderboard and keeps the high score shown in game up to date\n
+    the leaderboard writes on its own thread, nothing here waits on the disk
+    """
+    global highScore
 
+    #a restart before the first block was placed is not a game
+    if engine.lastPieces == 0:
+        return
+    leaderboard.add(settings.get("name", "PLAYER"), score, engine.lastLines, engine.lastPieces)
+    if score > highScore:
+        highScore = score
 
+def menu(arg):
+    global mode
+    if arg == "exit":
+        sys.exit()
+    elif arg == "start":
+        mode = "game"
+    elif arg == "settings":
+        mode = "settings"
+    elif arg == "scores":
+        mode = "scores"
+    elif arg == "menu":
+        mode = "menu"
 
+def settingsMenu(arg):
+    global mode
+    if arg == "back":
+        mode = "menu"
+        print(settings)
 
-        #refreshes the screen
-        screen.blit(display, (0,0))
-        pygame.display.flip()
-        display.fill((22,22,22))
-        screen.fill((222,222,222))
+        f = open(find_data_file("settings.txt"), "w")
+        f.write(str(settings))
 
-        #user input
-        keys = getKeys()
-        if pygame.time.get_ticks() - lastTime > 150: #timer based
-            if keys:
-                lastTime = pygame.time.get_ticks()
-            if settings["left"] in keys:
-                if block.pos[0] != 0:
-                    positions = block.getAbsPos(grid)
-                    rouch = False
-                    for pos in positions:
-                        if pos:
-                            x,y = pos
-                            x -= 1
-                            if grid[y][x] == 1:
-                                touch = True
-
-                    if not touch:
-                        block.pos[0] -= 1
-
-            elif settings["right"] in keys:
-                if block.pos[0] + block.size[0] != size[0]/gridW:
-                    positions = block.getAbsPos(grid)
-                    rouch = False
-                    for pos in positions:
-                        if pos:
-                            x,y = pos
-                            x += 1
-                            if grid[y][x] == 1:
-                                touch = True
-
-                    if not touch:
-                        block.pos[0] += 1
-
-            if settings["speed"] in keys:
-                gTime = 100/speedMult
-            else:
-                gTime = 500/speedMult
-
-        #one input for key push
-        if settings["rotate"] in keys:
-            if settings["rotate"] not in pushedKeys:
-                block.rotate(grid)
-                pushedKeys.append(settings["rotate"])
-        
-        if settings["drop"] in keys:
-            if settings["drop"] not in pushedKeys:
-                block.floor(grid)
-                pushedKeys.append(settings["drop"])
-                hard = True
-
-        for key in pushedKeys:
-            if key not in keys:
-                pushedKeys.remove(key)
-
-        #Gravity
-        if pygame.time.get_ticks() - lastTime2 > gTime/speedMult:
-            lastTime2 = pygame.time.get_ticks()
-            if block.pos[1] + block.size[1] < size[1]/gridW:
-                positions = block.getAbsPos(grid)
-                touch = False
-                for pos in positions:
-                    if pos:
-                        dwn = (pos[0], pos[1] + 1)
-                        try:
-                            if grid[dwn[1]][dwn[0]] == 1:
-                                if dwn[0] >= 0 and dwn[1] >= 0:
-                                    touch = True
-                        except:
-                            pass
-                if not touch:
-                    block.pos[1] += 1
-                else:
-                    block, nextBlock = placeBlocks(block, nextBlock)
-
-            else: #touching bottom
-                block, nextBlock = placeBlocks(block, nextBlock)
-
-        #row clear Detection
-        row = []
-        for y in range(len(grid)):
-            all1 = True
-            for x in range(len(grid[0])):
-                if grid[y][x] == 0:
-                    all1 = False
-            if all1:
-                row.append(y)
-
-        for t in row:
-
-            x = grid.pop(t)
-            grid = grid[::-1]
-
-            ls = []
-            for i in range(len(x)):
-                ls.append(0)
-
-            grid.append(ls)
-            grid = grid[::-1]
-
-        #add score for row clear
-        m = len(row)
-        numLines += m
-        if m == 1:
-            m = 40
-        elif m == 2:
-            m = 100
-        elif m == 3:
-            m = 300
-        elif m == 4:
-            m = 1200
-        score += m
-
-        if numLines > 0:
-            x = int((numLines - 10)/10)/10
-            speedMult = x +1
-
-    if mode == "menu":
-
-        for btn in menuBtns:
-            screen.blit(btn.draw(), btn.pos)
-            btn.tick()
+        controls.bind(settings)
 
-        screen.blit(logo, (panelSize*3/2 - logo.get_width()/2, 450))
-        
+def saveReplay(recorder):
+    """
+    saveReplay (recorder): writes the recorded session to the replays folder
+    """
+    folder = find_data_file("replays")
+    if not os.path.isdir(folder):
+        os.mkdir(folder)
+    recorder.save(os.path.join(folder, time.strftime("%Y%m%d-%H%M%S.ttr")))
 
+size = (300,720)   #board size in pixels, set from the width and height settings in main
+gridW = 30
+border = 2
+panelSize = 300
+windowH = 720
 
-        #refreshes the screen
-        screen.blit(display, (0,0))
-        pygame.display.flip()
-        display.fill((22,22,22))
-        screen.fill((222,222,222))
+mode = "menu"
+highScore = 0
+settings = {}
+engine = None
+controls = None
+leaderboard = None
+requested = []  #actions from the buttons for the next step
+
+def main():
+    global engine
+    global controls
+    global highScore
+    global settings
+    global leaderboard
+    global size
+    global gridW
+    global border
+
+    pygame.init()
+
+    f = open(find_data_file("settings.txt"))
+    r = f.read()
+    f.close()
+
+    settings = ast.literal_eval(r)
+    print(settings)
+
+    #the board is width x height cells, the cells shrink so big boards still fit the window
+    width = min(max(int(settings.get("width", 10)), 4), 255)
+    height = min(max(int(settings.get("height", 24)), 4), 255)
+    gridW = max(1, min(30, windowH//height, 900//width))
+    border = min(2, (gridW - 1)//4)
+    size = (width*gridW, height*gridW)
+
+    # makes two Surfaces one as the screen the other as a mimic screen
+    # this is useful for post-process scaling
+    screen = pygame.display.set_mode((size[0] + panelSize, windowH))
+    display = pygame.Surface((size[0], windowH))
+    display.fill((22,22,22))
+    screen.fill((222,222,222))
+    screen.blit(display,(0,0))
+    pygame.display.flip()
+
+    pygame.display.set_caption('Tetris')
+
+    #the menu's images are read and converted here, the rest the first time a screen needs them
+    assets.preload(["b.png", "bP.png", "logo.png"])
+
+    #every finished game goes in the leaderboard, the old single high score is moved into it once
+    leaderboard = Leaderboard(find_data_file("scores.db"))
+    atexit.register(leaderboard.close)
+    highScore = leaderboard.best()
+    with open(find_data_file("hs.txt")) as f:
+        legacy = int(f.read() or 0)
+    if legacy > highScore:
+        leaderboard.add(settings.get("name", "PLAYER"), legacy)
+        highScore = legacy
+
+    controls = Controls(settings)
+
+    #picks up the game that was running when the program last closed or crashed, a recorded session
+    #always starts a new game since its replay starts from the seed
+    autosaver = None
+    engine = None
+    if settings.get("autosave", 1):
+        autosaver = Autosaver(find_data_file("save.ttsv"))
+        if not settings.get("record"):
+            engine = autosaver.load(saveHighScore)
+        if engine and (engine.width, engine.height) != (width, height):
+            engine = None
+
+    #creates the grid and the first blocks
+    if engine is None:
+        engine = TetrisEngine(width, height, saveHighScore, bag=settings.get("bag", 0))
+    if autosaver:
+        atexit.register(autosaver.close, engine)
+
+    #the simulation runs in fixed steps, drawing is capped at fps
+    scheduler = Scheduler(settings.get("tickRate", 120))
+    clock = pygame.time.Clock()
+    fps = settings.get("fps", 60)
+    lastMode = None
+
+    #every step of the session is recorded and saved to replays/ on exit
+    step = engine.step
+    if settings.get("record"):
+        recorder = Recorder(engine, scheduler.dt)
+        step = recorder.step
+        atexit.register(saveReplay, recorder)
+
+    #per phase timings, F3 shows them over the right panel
+    profiler = None
+    if settings.get("profile"):
+        profiler = FrameProfiler(csvPath=find_data_file("profile.csv"))
+        atexit.register(profiler.close)
+
+    #only the menu is built before the first frame, the other screens are made the first time they are shown
+    screens = {}
+    makers = {
+        "game": lambda: GameScreen(screen, display, engine, scheduler, step, profiler),
+        "scores": lambda: ScoresScreen(screen, display, leaderboard),
+        "settings": lambda: SettingsScreen(screen),
+    }
+
+    startBtn = Button(["b.png", "bP.png"], "START", (222,222,222), (size[0] + panelSize/2, 100), menu, "start", centered=True)
+    settingsBtn = Button(["b.png", "bP.png"], "SETTINGS", (222,222,222), (size[0] + panelSize/2, 300), menu, "settings", centered=True)
+    ScoresBtn = Button(["b.png", "bP.png"], "SCORES", (222,222,222), (size[0] + panelSize/2, 200), menu, "scores", centered=True)
+    ExitBtn = Button(["b.png", "bP.png"], "EXIT", (222,222,222), (size[0] + panelSize/2, 400), menu, "exit", centered=True)
+
+    logo = assets.image("logo.png")
+
+    menuBtns = [startBtn, settingsBtn, ScoresBtn, ExitBtn]
+
+    #set by the startup benchmark, see bench.py --startup
+    startupBench = os.environ.get("TETRIS_STARTUP_BENCH")
+
+    while True:
+        controls.typed = []
+        if profiler:
+            profiler.start()
+
+        #menus sleep until there is an event, the timeout keeps the text cursor blinking
+        if mode != "game" and mode == lastMode:
+            events = [pygame.event.wait(500)] + pygame.event.get()
+        else:
+            events = pygame.event.get()
+
+        now = pygame.time.get_ticks()
+        for event in events:
+            if event.type == pygame.QUIT:
+                sys.exit()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3 and "game" in screens:
+                screens["game"].toggleProfiler()
+            controls.handle(event, now)
+        if profiler:
+            profiler.mark("events")
+
+        #a new screen is drawn from scratch
+        redraw = mode != lastMode
+        if redraw:
+            display.fill((22,22,22))
+            screen.fill((222,222,222))
+            if mode in makers and mode not in screens:
+                screens[mode] = makers[mode]()
+            if mode == "scores":
+                screens["scores"].reset()
+            lastMode = mode
+
+        if mode == "game":
+            screens["game"].frame(now, redraw)
+            if autosaver and autosaver.due(now):
+                autosaver.save(engine)
+        else:
+            #keys pressed on the menus never reach the game, even before it was first opened
+            controls.clear()
+            if "game" in screens:
+                screens["game"].pause()
 
-    if mode == "settings":
+        if mode == "menu":
 
-        f = pygame.font.SysFont("", 35, True)
+            for btn in menuBtns:
+                btn.tick()
+                screen.blit(btn.draw(), btn.pos)
 
-        GRD = f.render("Show Grid: ", True, (22,22,22))
+            screen.blit(logo, (size[0] + panelSize/2 - logo.get_width()/2, 450))
 
-        screen.blit(GRD, (panelSize+15, 400))
 
-        screen.blit(backBtn.draw(), backBtn.pos)
-        backBtn.tick()
 
-        screen.blit(showGrid.draw(), showGrid.pos)
-        showGrid.tick()
+            #refreshes the screen
+            screen.blit(display, (0,0))
+            pygame.display.flip()
+            display.fill((22,22,22))
+            screen.fill((222,222,222))
 
-        for i in inputs:
+            if startupBench:
+                os._exit(0)
 
-            t = f.render(i.id, True, (22,22,22))
+        if mode == "scores":
+            screens["scores"].draw()
 
-            screen.blit(t, (panelSize+15, i.getCenter()[1]))
+            #refreshes the screen
+            screen.blit(display, (0,0))
+            pygame.display.flip()
+            display.fill((22,22,22))
+            screen.fill((222,222,222))
 
-            screen.blit(i.draw(), i.getCenter())
-            i.tick()
+        if mode == "settings":
+            screens["settings"].draw()
 
-            settings[i.id] = i.savedText
+            #refreshes the screen
+            screen.blit(display, (0,0))
+            pygame.display.flip()
+            display.fill((22,22,22))
+            screen.fill((222,222,222))
 
-        settings["grid"] = showGrid.state
+        clock.tick(fps)
 
-        #refreshes the screen
-        screen.blit(display, (0,0))
-        pygame.display.flip()
-        display.fill((22,22,22))
-        screen.fill((222,222,222))
\ No newline at end of file
+if __name__ == "__main__":
+    main()
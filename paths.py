@@ -0,0 +1,19 @@
+"Finds the data files next to the game, importable without pygame"
+import os
+import sys
+
+
+def find_data_file(filename):
+    """
+    find_data_file (filename) : Finds the absolute position of a file for when the game is compiled into an exe
+    filename : string including for filename "example.txt"
+    """
+    if getattr(sys, 'frozen', False):
+        # The application is frozen
+        datadir = os.path.dirname(sys.executable)
+    else:
+        # The application is not frozen
+        # Change this bit to match where you store your data files:
+        datadir = os.path.dirname(__file__)
+
+    return os.path.join(datadir, filename)
@@ -0,0 +1,93 @@
+"Board renderer that goes through a NumPy array of cell colors instead of one blit per cell"
+import numpy as np
+import pygame
+
+from batch import cellArray
+
+
+class ArrayLayer (object):
+    """
+    ArrayLayer (size, background, color, gridSize, borderLen): drop in for StackLayer for very large boards\n
+    the board is kept as one pixel per cell, the rows that changed are written with surfarray, scaled up to
+    gridSize in one transform.scale and the cell borders are laid over them from a precomputed mask,
+    so the work follows the changed rows instead of the number of placed cells\n
+    dirty is the pixel Rect the last update changed
+    """
+    def __init__(self, size, background, color, gridSize, borderLen):
+        self.surface = pygame.Surface(size)
+        self.background = background
+        self.color = color
+        self.gridSize = gridSize
+        self.borderLen = borderLen
+        self.palette = np.array([background, color], np.uint8)
+
+        self.cells = None
+        self.small = None
+        self.grid = None
+        self.version = -1
+        self.dirty = self.surface.get_rect()
+
+        #border lines of every cell, the inside of the cells is the color key
+        self.border = pygame.Surface(size)
+        self.border.fill((255,0,255))
+        self.border.set_colorkey((255,0,255))
+        if borderLen:
+            w,h = size
+            for x in range(0, w, gridSize):
+                self.border.fill((20,20,20), (x, 0, borderLen, h))
+                self.border.fill((20,20,20), (x + gridSize - borderLen, 0, borderLen, h))
+            for y in range(0, h, gridSize):
+                self.border.fill((20,20,20), (0, y, w, borderLen))
+                self.border.fill((20,20,20), (0, y + gridSize - borderLen, w, borderLen))
+
+    def invalidate(self):
+        """
+        invalidate (): forces a full redraw on the next update
+        """
+        self.grid = None
+
+    def update(self, grid):
+        """
+        update (grid): redraws the rows of the layer that changed since the last call, returns True if any did\n
+        grid : a Board
+        """
+        if grid is self.grid and grid.version == self.version:
+            return False
+        full = grid is not self.grid or self.cells is None
+        self.grid = grid
+        self.version = grid.version
+
+        cells = cellArray(grid.rows, grid.width)
+        if full:
+            changed = np.arange(grid.height)
+            self.small = pygame.Surface((grid.width, grid.height))
+        else:
+            changed = np.flatnonzero((cells != self.cells).any(axis=1))
+        self.cells = cells
+        if not len(changed):
+            self.dirty = pygame.Rect(0, 0, 0, 0)
+            return True
+
+        #one pixel per cell for the band of rows that changed, then scaled up in one go
+        top, bottom = changed[0], changed[-1] + 1
+        band = pygame.Rect(0, top, grid.width, bottom - top)
+        pixels = self.palette[cells[top:bottom].astype(np.uint8)]
+        pygame.surfarray.blit_array(self.small.subsurface(band), pixels.transpose(1, 0, 2))
+
+        g = self.gridSize
+        dirty = pygame.Rect(0, top*g, grid.width*g, (bottom - top)*g)
+        pygame.transform.scale(self.small.subsurface(band), dirty.size, self.surface.subsurface(dirty))
+
+        #borders only go around filled cells, empty ones are plain background
+        mask = pygame.Surface(dirty.size)
+        mask.fill((255,0,255))
+        mask.blit(self.border, (0,0), dirty)
+        mask.set_colorkey((255,0,255))
+        holes = pygame.surfarray.pixels2d(mask)
+        empty = np.repeat(np.repeat(~cells[top:bottom], g, axis=0), g, axis=1).T
+        holes[empty] = mask.map_rgb((255,0,255))
+        del holes
+        self.surface.blit(mask, dirty)
+
+        self.dirty = dirty
+        return True
@@ -0,0 +1,143 @@
+"Per phase frame timings with rolling percentiles, an on screen overlay and CSV export"
+import csv
+import time
+from collections import deque
+
+from graphics import fonts
+
+PHASES = ["events", "input", "gravity", "rows", "stack", "hud", "flip"]
+
+
+class FrameProfiler (object):
+    """
+    FrameProfiler (window, csvPath): times each phase of every game frame\n
+    window  : how many recent frames the percentiles and averages cover\n
+    csvPath : optional file that gets one row of timings (ms) per frame\n
+    call start() at the top of the frame, mark(phase) after each phase and end() after the last one,
+    time spent in functions wrapped with timed() is moved out of the phase they ran in into their own
+    """
+    def __init__(self, window=600, csvPath=None):
+        self.window = window
+        self.frames = deque(maxlen=window)      #(total, {phase: seconds}) per frame
+        self.current = {}
+        self.nested = {}
+        self.last = None
+        self.frameStart = None
+        self.count = 0
+        self.visible = False
+        self.shownAt = 0
+
+        self.csvFile = None
+        self.writer = None
+        if csvPath:
+            self.csvFile = open(csvPath, "w", newline="")
+            self.writer = csv.writer(self.csvFile)
+            self.writer.writerow(["frame", "total"] + PHASES)
+
+    def start(self):
+        now = time.perf_counter()
+        self.frameStart = now
+        self.last = now
+        self.current = {}
+        self.nested = {}
+
+    def mark(self, phase):
+        """
+        mark (phase): charges the time since the last mark to phase, less any nested timed() calls
+        """
+        if self.last is None:
+            return
+        now = time.perf_counter()
+        elapsed = now - self.last
+        self.last = now
+
+        for name in self.nested:
+            took = self.nested[name]
+            self.current[name] = self.current.get(name, 0) + took
+            elapsed -= took
+        self.nested = {}
+        self.current[phase] = self.current.get(phase, 0) + elapsed
+
+    def timed(self, fn, phase):
+        """
+        timed (fn, phase): returns fn wrapped so its time is charged to phase
+        """
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.nested[phase] = self.nested.get(phase, 0) + time.perf_counter() - start
+        return wrapper
+
+    def end(self):
+        """
+        end (): finishes the frame, stores it and writes the CSV row
+        """
+        if self.frameStart is None:
+            return
+        total = time.perf_counter() - self.frameStart
+        self.frameStart = None
+        self.last = None
+        self.count += 1
+        self.frames.append((total, self.current))
+
+        if self.writer:
+            self.writer.writerow([self.count, "%.4f" % (total*1000)] + ["%.4f" % (self.current.get(p, 0)*1000) for p in PHASES])
+            if self.count % 120 == 0:
+                self.csvFile.flush()
+
+    def close(self):
+        if self.csvFile:
+            self.csvFile.close()
+            self.csvFile = None
+            self.writer = None
+
+    def percentiles(self, points=(50, 95, 99)):
+        """
+        percentiles (points): returns the frame time in ms at each percentile over the window
+        """
+        totals = sorted(f[0] for f in self.frames)
+        if not totals:
+            return [0 for p in points]
+        return [totals[min(len(totals) - 1, int(len(totals)*p/100))]*1000 for p in points]
+
+    def averages(self):
+        """
+        averages (): returns {phase: mean ms} over the window
+        """
+        n = max(len(self.frames), 1)
+        out = {}
+        for phase in PHASES:
+            out[phase] = sum(f[1].get(phase, 0) for f in self.frames)*1000/n
+        return out
+
+    def toggle(self):
+        self.visible = not self.visible
+
+    def due(self, now, every=250):
+        """
+        due (now, every): returns True if the overlay should be redrawn, at most once per every ms
+        """
+        if now - self.shownAt >= every:
+            self.shownAt = now
+            return True
+        return False
+
+    def draw(self, surface, rect, background, color):
+        """
+        draw (surface, rect, background, color): draws the overlay text into rect, returns rect
+        """
+        surface.fill(background, rect)
+        p50, p95, p99 = self.percentiles()
+        lines = ["p50 %.2f  p95 %.2f  p99 %.2f ms" % (p50, p95, p99)]
+        averages = self.averages()
+        for phase in PHASES:
+            lines.append("%-8s %6.3f ms" % (phase, averages[phase]))
+
+        y = rect.top
+        for line in lines:
+            t = fonts.render(line, color, 20, bold=False)
+            surface.blit(t, (rect.left, y))
+            y += t.get_height()
+        return rect
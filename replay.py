@@ -0,0 +1,174 @@
+"""
+Records games as the seed plus every step's actions and replays them headless at full speed
+
+    python replay.py session.ttr
+
+File layout (little endian):
+    header : b"TTRP", version u8, flags u8 (1 = 7-bag), width u8, height u8, seed u64, default dt f64 (ms)
+    steps  : skip varint, count varint, [dt f64], count action bytes
+
+skip is how many steps with no actions and the default dt came before this one, the low bit of count
+says the step has its own dt and the rest is the number of actions. Steps are timestamped by their
+position, so a game that sits idle costs a few bytes per second.
+"""
+import struct
+import sys
+import time
+
+from engine import TetrisEngine
+
+MAGIC = b"TTRP"
+VERSION = 2
+HEADER = struct.Struct("<4sBBBBQd")
+DT = struct.Struct("<d")
+
+ACTIONS = ["left", "right", "rotate", "drop", "speed", "restart"]
+CODES = dict((ACTIONS[i], i) for i in range(len(ACTIONS)))
+
+CUSTOM_DT = 1
+
+
+def writeVarint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def readVarint(data, i):
+    n = 0
+    shift = 0
+    while True:
+        b = data[i]
+        i += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, i
+        shift += 7
+
+
+class Recorder (object):
+    """
+    Recorder (engine, dt): steps a TetrisEngine and records every step\n
+    engine : the TetrisEngine to drive, it must not be stepped any other way while recording\n
+    dt     : the usual step length in ms, steps of other lengths cost 8 more bytes
+    """
+    def __init__(self, engine, dt):
+        self.engine = engine
+        self.dt = dt
+        self.data = bytearray(HEADER.pack(MAGIC, VERSION, 1 if engine.source.bag else 0,
+                                          engine.width, engine.height, engine.seed, dt))
+        self.skip = 0
+
+    def step(self, actions, dt):
+        """
+        step (actions, dt): records then runs TetrisEngine.step(actions, dt), returns its result
+        """
+        if not actions and dt == self.dt:
+            self.skip += 1
+        else:
+            self.write(actions, dt)
+        return self.engine.step(actions, dt)
+
+    def write(self, actions, dt):
+        data = self.data
+        writeVarint(data, self.skip)
+        self.skip = 0
+
+        if dt == self.dt:
+            writeVarint(data, len(actions) << 1)
+        else:
+            writeVarint(data, len(actions) << 1 | CUSTOM_DT)
+            data += DT.pack(dt)
+        for action in actions:
+            data.append(CODES[action])
+
+    def tobytes(self):
+        """
+        tobytes (): returns the recording so far, idle steps at the end included
+        """
+        data = bytearray(self.data)
+        if self.skip:
+            #one last empty step closes the run of idle steps
+            writeVarint(data, self.skip - 1)
+            data.append(0)
+        return bytes(data)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.tobytes())
+
+
+class Replay (object):
+    """
+    Replay (data): a parsed recording\n
+    data : bytes written by Recorder
+    """
+    def __init__(self, data):
+        magic, version, flags, width, height, seed, dt = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("not a tetris replay")
+        if version != VERSION:
+            raise ValueError("unsupported replay version %d" % version)
+        self.data = data
+        self.bag = bool(flags & 1)
+        self.width = width
+        self.height = height
+        self.seed = seed
+        self.dt = dt
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    def steps(self):
+        """
+        steps (): yields (actions, dt) for every recorded step in order
+        """
+        data = self.data
+        i = HEADER.size
+        empty = []
+        while i < len(data):
+            skip, i = readVarint(data, i)
+            for n in range(skip):
+                yield empty, self.dt
+
+            count, i = readVarint(data, i)
+            dt = self.dt
+            if count & CUSTOM_DT:
+                dt = DT.unpack_from(data, i)[0]
+                i += DT.size
+            count >>= 1
+            yield [ACTIONS[c] for c in data[i:i+count]], dt
+            i += count
+
+    def play(self, onLoose=None):
+        """
+        play (onLoose): runs the whole recording on a new headless TetrisEngine as fast as possible and returns it
+        """
+        engine = TetrisEngine(self.width, self.height, onLoose, self.seed, self.bag)
+        step = engine.step
+        for actions, dt in self.steps():
+            step(actions, dt)
+        return engine
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("usage: python replay.py FILE [FILE ...]")
+        return
+
+    for path in argv:
+        scores = []
+        start = time.perf_counter()
+        replay = Replay.load(path)
+        engine = replay.play(scores.append)
+        wall = time.perf_counter() - start
+        print("%s: seed %d, %d games %s, current score %d, %d lines, %.3fs" % (
+            path, replay.seed, len(scores), scores, engine.score, engine.numLines, wall))
+
+
+if __name__ == "__main__":
+    main()
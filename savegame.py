@@ -0,0 +1,178 @@
+"""
+Snapshots of a game in progress, saved in the background so a crash or a quit loses at most a second of play
+
+File layout (little endian):
+    header : b"TTSV", version u8, flags u8 (1 = 7-bag), width u8, height u8, seed u64
+    state  : score u64, lines u32, pieces u32, games u32, speedMult f64, gravity timer f64, hard u8
+    blocks : active then next, piece u8, rotation u8, x i16, y i16
+    rows   : height rows of (width+7)//8 bytes, bit x is column x
+    rng    : 625 u32 Mersenne Twister state, has gauss u8, gauss f64, bag count u8, bag pieces u8
+"""
+import os
+import struct
+import threading
+
+from engine import Block, TetrisEngine
+
+MAGIC = b"TTSV"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBBQ")
+STATE = struct.Struct("<QIIIddB")
+BLOCK = struct.Struct("<BBhh")
+RNG = struct.Struct("<625I")
+GAUSS = struct.Struct("<Bd")
+
+
+def snapshot(engine):
+    """
+    snapshot (engine): returns the whole state of a TetrisEngine as bytes, see restore
+    """
+    source = engine.source
+    data = bytearray(HEADER.pack(MAGIC, VERSION, 1 if source.bag else 0, engine.width, engine.height, engine.seed))
+    data += STATE.pack(engine.score, engine.numLines, engine.pieces, engine.games,
+                       engine.speedMult, engine.gravityTimer, engine.hard)
+    for block in (engine.block, engine.nextBlock):
+        data += BLOCK.pack(block.piece, block.rotation, block.pos[0], block.pos[1])
+
+    rowBytes = (engine.width + 7)//8
+    for row in engine.grid.rows:
+        data += row.to_bytes(rowBytes, "little")
+
+    version, state, gauss = source.rng.getstate()
+    data += RNG.pack(*state)
+    data += GAUSS.pack(gauss is not None, gauss or 0)
+    data.append(len(source.queue))
+    data += bytes(source.queue)
+    return bytes(data)
+
+
+def restore(data, onLoose=None):
+    """
+    restore (data, onLoose): returns a TetrisEngine in the state a snapshot was taken in, raises ValueError for anything else
+    """
+    try:
+        magic, version, flags, width, height, seed = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("not a tetris save")
+        if version != VERSION:
+            raise ValueError("unsupported save version %d" % version)
+        engine = TetrisEngine(width, height, onLoose, seed, bool(flags & 1))
+        i = HEADER.size
+
+        (engine.score, engine.numLines, engine.pieces, engine.games,
+         engine.speedMult, engine.gravityTimer, hard) = STATE.unpack_from(data, i)
+        engine.hard = bool(hard)
+        i += STATE.size
+
+        blocks = []
+        for n in range(2):
+            piece, rotation, x, y = BLOCK.unpack_from(data, i)
+            block = Block(None, (200,200,200), [x, y], piece)
+            block.setRotation(rotation)
+            blocks.append(block)
+            i += BLOCK.size
+        engine.block, engine.nextBlock = blocks
+
+        rowBytes = (width + 7)//8
+        rows = []
+        for y in range(height):
+            rows.append(int.from_bytes(data[i:i+rowBytes], "little"))
+            i += rowBytes
+        engine.grid.setRows(rows)
+
+        state = RNG.unpack_from(data, i)
+        i += RNG.size
+        hasGauss, gauss = GAUSS.unpack_from(data, i)
+        i += GAUSS.size
+        engine.source.rng.setstate((3, state, gauss if hasGauss else None))
+        count = data[i]
+        engine.source.queue = list(data[i+1:i+1+count])
+    except (struct.error, IndexError) as e:
+        raise ValueError("truncated tetris save: %s" % e)
+    return engine
+
+
+def load(path, onLoose=None):
+    """
+    load (path, onLoose): returns the TetrisEngine saved at path, None if there is no usable save
+    """
+    try:
+        with open(path, "rb") as f:
+            return restore(f.read(), onLoose)
+    except (OSError, ValueError):
+        return None
+
+
+class Autosaver (object):
+    """
+    Autosaver (path, every): keeps the latest snapshot of a game on disk\n
+    every : ms between saves\n
+    save() only takes the snapshot, a writer thread puts it on disk through a temporary file and a rename,
+    so the file is always either the old snapshot or the new one, never half of each
+    """
+    def __init__(self, path, every=1000):
+        self.path = path
+        self.every = every
+        self.last = None
+        self.lastData = None
+        self.latest = None
+        self.closed = False
+        self.lock = threading.Condition()
+        self.writer = threading.Thread(target=self.write, name="autosave", daemon=True)
+        self.writer.start()
+
+    def load(self, onLoose=None):
+        """
+        load (onLoose): returns the TetrisEngine saved at path, None if there is no usable save
+        """
+        return load(self.path, onLoose)
+
+    def due(self, now):
+        """
+        due (now): returns True if the last save is at least every ms older than now (ms)
+        """
+        if self.last is None or now - self.last >= self.every:
+            self.last = now
+            return True
+        return False
+
+    def save(self, engine):
+        """
+        save (engine): hands a snapshot of engine to the writer thread unless nothing changed since the last one
+        """
+        data = snapshot(engine)
+        if data == self.lastData:
+            return
+        self.lastData = data
+        with self.lock:
+            #a snapshot still waiting is replaced, only the newest one matters
+            self.latest = data
+            self.lock.notify()
+
+    def write(self):
+        while True:
+            with self.lock:
+                while self.latest is None and not self.closed:
+                    self.lock.wait()
+                data = self.latest
+                self.latest = None
+                if data is None:
+                    return
+
+            tmp = self.path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+
+    def close(self, engine=None):
+        """
+        close (engine): saves engine one last time if given, waits for the writes and stops the writer thread
+        """
+        if engine is not None:
+            self.save(engine)
+        with self.lock:
+            self.closed = True
+            self.lock.notify()
+        self.writer.join()
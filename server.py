@@ -0,0 +1,411 @@
+"""
+Hosts many solo and head to head games in one process, stepped by a single asyncio tick loop
+
+    python server.py --port 7777                   run a server
+    python client.py --host 127.0.0.1 --versus     play on it
+    python server.py --loadtest 200                start a server and 200 bot players on loopback and report
+
+Messages are a type byte and a u32 length followed by the body (little endian):
+    HELLO  client : mode u8 (0 solo, 1 versus)
+    INPUT  client : one action code byte per action, see replay.ACTIONS
+    FULL   server : width u8, height u8, seed u64, then every row as (width+7)//8 bytes
+    STATE  server : tick u32, score u32, lines u32, piece u8, rotation u8, x i16, y i16, next u8,
+                    opponent score i32 (-1 when solo), row count u8, then row count times (y u8, row bytes)
+    OVER   server : final score u32, won u8, sent when a game ends, a FULL of the next game follows
+    STATS  both   : empty from the client, JSON of the server's tick statistics back
+
+STATE only carries the rows that changed since the last STATE the client got, and it is only sent on
+ticks where something changed at all. A client message over MAX_BODY bytes closes its connection and
+input beyond MAX_PENDING actions waiting for the next tick is dropped, so no one client can stall the tick.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+import sys
+import time
+from collections import deque
+
+from engine import TetrisEngine, Scheduler
+from replay import ACTIONS, CODES
+
+HEADER = struct.Struct("<BI")
+HELLO, INPUT, FULL, STATE, OVER, STATS = range(1, 7)
+
+FULL_HEAD = struct.Struct("<BBQ")
+STATE_HEAD = struct.Struct("<IIIBBhhBiB")
+OVER_BODY = struct.Struct("<IB")
+
+SOLO, VERSUS = 0, 1
+
+MAX_BODY = 4096     #largest message body a client may send
+MAX_PENDING = 64    #most actions a player can have waiting for one tick
+
+
+def message(kind, body=b""):
+    return HEADER.pack(kind, len(body)) + body
+
+
+def packRows(rows, width):
+    n = (width + 7)//8
+    return b"".join([row.to_bytes(n, "little") for row in rows])
+
+
+def unpackRows(data, width, height):
+    n = (width + 7)//8
+    return [int.from_bytes(data[i*n:(i+1)*n], "little") for i in range(height)]
+
+
+def fullMessage(engine):
+    return message(FULL, FULL_HEAD.pack(engine.width, engine.height, engine.seed) + packRows(engine.grid.rows, engine.width))
+
+
+class Player (object):
+    """
+    Player (writer, mode): one connection and the game it plays\n
+    sent is the board as the client last saw it, STATE messages carry the rows that differ from it
+    """
+    def __init__(self, writer, mode):
+        self.writer = writer
+        self.mode = mode
+        self.engine = None
+        self.session = None
+        self.pending = []
+        self.sent = None
+        self.lastState = None
+
+    def start(self, seed):
+        self.engine = TetrisEngine(seed=seed, onLoose=self.over)
+        self.pending = []
+        self.sent = list(self.engine.grid.rows)
+        self.lastState = None
+        self.send(fullMessage(self.engine))
+
+    def over(self, score):
+        self.session.over(self, score)
+
+    def send(self, data):
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+    def state(self, tick, opponent):
+        """
+        state (tick, opponent): sends what changed since the last STATE, nothing if nothing did
+        """
+        engine = self.engine
+        block = engine.block
+        key = (engine.grid.version, engine.score, block.piece, block.rotation, block.pos[0], block.pos[1], engine.nextBlock.piece, opponent)
+        if key == self.lastState:
+            return
+        #a client that stops reading gets nothing more until it catches up, the deltas stay valid since sent is not updated
+        if self.writer.transport.get_write_buffer_size() > 1 << 16:
+            return
+        self.lastState = key
+
+        rows = engine.grid.rows
+        sent = self.sent
+        width = engine.width
+        n = (width + 7)//8
+        changed = [y for y in range(engine.height) if rows[y] != sent[y]]
+        body = bytearray(STATE_HEAD.pack(tick, engine.score, engine.numLines, block.piece, block.rotation,
+                                         block.pos[0], block.pos[1], engine.nextBlock.piece, opponent, len(changed)))
+        for y in changed:
+            body.append(y)
+            body += rows[y].to_bytes(n, "little")
+            sent[y] = rows[y]
+        self.send(message(STATE, bytes(body)))
+
+
+class Session (object):
+    """
+    Session (players, seed): a solo game or two players racing on the same pieces
+    """
+    def __init__(self, players, seed):
+        self.players = players
+        self.seed = seed
+        self.restart = False
+        for player in players:
+            player.session = self
+            player.start(seed)
+
+    def over(self, player, score):
+        """
+        over (player, score): player topped out, in head to head the other one wins and both start again
+        """
+        if len(self.players) == 1:
+            player.send(message(OVER, OVER_BODY.pack(score, 0)))
+            self.seed += 1
+            player.start(self.seed)
+            return
+        for other in self.players:
+            if other is player:
+                other.send(message(OVER, OVER_BODY.pack(score, 0)))
+            else:
+                other.send(message(OVER, OVER_BODY.pack(other.engine.score, 1)))
+        #restarted after the tick so the other player's step is not cut short
+        self.restart = True
+
+    def remove(self, player):
+        self.players.remove(player)
+
+
+class Server (object):
+    """
+    Server (rate): every session in the process is stepped by one tick loop running rate ticks a second\n
+    tick latency is how long the ticks take, lateness how far behind their schedule they start
+    """
+    def __init__(self, rate=60):
+        self.rate = rate
+        self.scheduler = Scheduler(rate, maxSteps=5)
+        self.sessions = []
+        self.waiting = None
+        self.nextSeed = int.from_bytes(os.urandom(6), "little")
+        self.ticks = 0
+        self.latency = deque(maxlen=10000)
+        self.lateness = deque(maxlen=10000)
+        self.cpuStart = time.process_time()
+        self.wallStart = time.perf_counter()
+
+    def seed(self):
+        self.nextSeed += 1
+        return self.nextSeed
+
+    async def serve(self, host="127.0.0.1", port=7777):
+        server = await asyncio.start_server(self.connect, host, port)
+        async with server:
+            await self.run()
+
+    async def connect(self, reader, writer):
+        writer.transport.set_write_buffer_limits(1 << 20)
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        player = None
+        try:
+            while True:
+                kind, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+                if length > MAX_BODY:
+                    break
+                body = await reader.readexactly(length)
+                if kind == HELLO and player is None:
+                    player = Player(writer, body[0] if body else SOLO)
+                    self.join(player)
+                elif kind == INPUT and player is not None:
+                    room = MAX_PENDING - len(player.pending)
+                    player.pending.extend([ACTIONS[c] for c in body[:room] if c < len(ACTIONS)])
+                elif kind == STATS:
+                    writer.write(message(STATS, json.dumps(self.stats()).encode()))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.leave(player)
+            writer.close()
+
+    def join(self, player):
+        if player.mode == VERSUS:
+            if self.waiting is None:
+                self.waiting = player
+                return
+            players = [self.waiting, player]
+            self.waiting = None
+        else:
+            players = [player]
+        self.sessions.append(Session(players, self.seed()))
+
+    def leave(self, player):
+        if player is None:
+            return
+        if self.waiting is player:
+            self.waiting = None
+        session = player.session
+        if session is None:
+            return
+        session.remove(player)
+        if not session.players:
+            self.sessions.remove(session)
+
+    async def run(self):
+        """
+        run (): the tick loop, steps every session at rate ticks a second until cancelled
+        """
+        loop = asyncio.get_running_loop()
+        period = 1/self.rate
+        due = loop.time()
+        dt = self.scheduler.dt
+        while True:
+            start = loop.time()
+            self.lateness.append(max(0, start - due))
+
+            for i in range(self.scheduler.advance(start*1000)):
+                self.tick(dt)
+            self.latency.append(loop.time() - start)
+
+            due += period
+            if due < loop.time():
+                due = loop.time()
+            await asyncio.sleep(due - loop.time())
+
+    def tick(self, dt):
+        """
+        tick (dt): steps every game once and sends the changes
+        """
+        self.ticks += 1
+        tick = self.ticks
+        for session in list(self.sessions):
+            session.restart = False
+            players = session.players
+            for player in players:
+                actions = player.pending
+                player.pending = []
+                player.engine.step(actions, dt)
+
+            if session.restart:
+                session.seed = self.seed()
+                for player in players:
+                    player.start(session.seed)
+
+            for player in players:
+                opponent = -1
+                for other in players:
+                    if other is not player:
+                        opponent = other.engine.score
+                player.state(tick, opponent)
+
+    def stats(self):
+        """
+        stats (): returns the tick statistics as a dict, times in ms
+        """
+        def percentile(values, p):
+            values = sorted(values)
+            if not values:
+                return 0
+            return values[min(len(values) - 1, int(len(values)*p/100))]*1000
+
+        wall = time.perf_counter() - self.wallStart
+        return {
+            "sessions": len(self.sessions),
+            "players": sum(len(s.players) for s in self.sessions),
+            "ticks": self.ticks,
+            "tickP50": percentile(self.latency, 50),
+            "tickP99": percentile(self.latency, 99),
+            "tickMax": percentile(self.latency, 100),
+            "lateP99": percentile(self.lateness, 99),
+            "cpu": (time.process_time() - self.cpuStart)/max(wall, 1e-9),
+        }
+
+
+class Reader (object):
+    """
+    Reader (): splits a byte stream into (type, body) messages, for clients reading without asyncio
+    """
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """
+        feed (data): adds received bytes, returns the list of complete messages
+        """
+        self.buffer += data
+        out = []
+        while len(self.buffer) >= HEADER.size:
+            kind, length = HEADER.unpack_from(self.buffer)
+            if len(self.buffer) < HEADER.size + length:
+                break
+            out.append((kind, bytes(self.buffer[HEADER.size:HEADER.size + length])))
+            del self.buffer[:HEADER.size + length]
+        return out
+
+
+def runServer(host, port, rate):
+    try:
+        asyncio.run(Server(rate).serve(host, port))
+    except KeyboardInterrupt:
+        pass
+
+
+async def bot(host, port, mode, seconds, counts):
+    """
+    bot (host, port, mode, seconds, counts): a client pressing random keys a few times a second, counts bytes and messages
+    """
+    import random
+    rng = random.Random()
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(message(HELLO, bytes([mode])))
+
+    async def press():
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            writer.write(message(INPUT, bytes([CODES[rng.choice(["left", "right", "rotate", "drop"])]])))
+            await asyncio.sleep(rng.uniform(0.1, 0.4))
+
+    async def read():
+        while True:
+            kind, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+            await reader.readexactly(length)
+            counts[kind] = counts.get(kind, 0) + 1
+            counts["bytes"] = counts.get("bytes", 0) + HEADER.size + length
+
+    reading = asyncio.ensure_future(read())
+    await press()
+    reading.cancel()
+    writer.close()
+
+
+async def fetchStats(host, port, delay):
+    await asyncio.sleep(delay)
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(message(STATS))
+    kind, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+    stats = json.loads(await reader.readexactly(length))
+    writer.close()
+    return stats
+
+
+async def loadTest(host, port, players, seconds, versus):
+    """
+    loadTest (host, port, players, seconds, versus): runs the bots against a server, returns (stats, counts, wall)\n
+    the server's statistics are fetched near the end while every bot is still playing
+    """
+    counts = {}
+    start = time.perf_counter()
+    bots = [bot(host, port, VERSUS if versus else SOLO, seconds, counts) for i in range(players)]
+    results = await asyncio.gather(fetchStats(host, port, seconds*0.9), *bots)
+    return results[0], counts, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Host tetris games over TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--rate", type=int, default=60, help="ticks per second")
+    parser.add_argument("--loadtest", type=int, default=0, help="start a server and this many bot players and report")
+    parser.add_argument("--seconds", type=float, default=10, help="length of the load test")
+    parser.add_argument("--versus", action="store_true", help="load test with head to head sessions")
+    args = parser.parse_args(argv)
+
+    if not args.loadtest:
+        runServer(args.host, args.port, args.rate)
+        return 0
+
+    import multiprocessing
+    process = multiprocessing.Process(target=runServer, args=(args.host, args.port, args.rate), daemon=True)
+    process.start()
+    time.sleep(1)
+    try:
+        stats, counts, wall = asyncio.run(loadTest(args.host, args.port, args.loadtest, args.seconds, args.versus))
+    finally:
+        process.terminate()
+
+    cpu = stats["cpu"]
+    print("%d players in %d sessions for %.1fs at %d ticks/s" % (stats["players"], stats["sessions"], wall, args.rate))
+    print("tick: p50 %.2f ms, p99 %.2f ms, max %.2f ms, start late p99 %.2f ms" % (stats["tickP50"], stats["tickP99"], stats["tickMax"], stats["lateP99"]))
+    print("server cpu: %.0f%% of one core, about %d players per core" % (cpu*100, args.loadtest/max(cpu, 1e-3)))
+    print("sent: %d STATE, %d FULL, %.1f KB/s per player" % (counts.get(STATE, 0), counts.get(FULL, 0), counts.get("bytes", 0)/1024/wall/args.loadtest))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
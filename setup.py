@@ -1,16 +1,11 @@
 "Program to build project into exexutable and installer"
 import sys
 from cx_Freeze import setup, Executable
-import os.path
 
 if 'bdist_msi' in sys.argv:
     PATH = "C:\Program Files\Tetris"
     #sys.argv += ['--initial-target-dir', PATH]
 
-PYTHON_INSTALL_DIR = os.path.dirname(os.path.dirname(os.__file__))
-os.environ['TCL_LIBRARY'] = os.path.join(PYTHON_INSTALL_DIR, 'tcl', 'tcl8.6')
-os.environ['TK_LIBRARY'] = os.path.join(PYTHON_INSTALL_DIR, 'tcl', 'tk8.6')
-
 shortcut_table = [
     ("DesktopShortcut",        # Shortcut
      "DesktopFolder",          # Directory_
@@ -40,8 +35,10 @@ setup(
     author = 'Ethan Armstrong',
     options={
         "build_exe": {
-            "packages":["pygame", "os", "sys", "random"],
-            "include_files":["hs.txt", "b.png", "bP.png", "icon.ico"],
+            #the game's own modules are found from main.py's imports, tkinter is never used
+            "packages":["pygame", "sqlite3"],
+            "excludes":["tkinter"],
+            "include_files":["hs.txt", "settings.txt", "b.png", "bP.png", "c.png", "cP.png", "logo.png", "icon.ico"],
             },
         "bdist_msi": bdist_msi_options,
     },
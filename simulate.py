@@ -0,0 +1,174 @@
+"""
+Runs many seeded headless games on a process pool and reports statistics
+
+    python simulate.py --games 1000 --player ai --processes 4 --out results.jsonl
+"""
+import argparse
+import importlib
+import json
+import os
+import random
+import sys
+import time
+
+from engine import TetrisEngine, speedFor
+from ai import AutoPlayer, playOut, runPool
+
+
+class RandomPlayer (object):
+    """
+    RandomPlayer (engine): presses a random key (or nothing) every gravity tick
+    """
+    choices = [[], ["left"], ["right"], ["rotate"], ["drop"]]
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.rng = random.Random(engine.seed)
+
+    def actions(self):
+        return self.rng.choice(self.choices)
+
+
+def aiPlayer(engine):
+    return AutoPlayer(engine, lookahead=False)
+
+def aiLookaheadPlayer(engine):
+    return AutoPlayer(engine, lookahead=True)
+
+players = {
+    "random": RandomPlayer,
+    "ai": aiPlayer,
+    "ai-lookahead": aiLookaheadPlayer,
+}
+
+
+def getPlayer(name):
+    """
+    getPlayer (name): returns the player factory for a built in name or a "module:attribute" path\n
+    a player factory is called with the TetrisEngine and returns an object whose actions() gives the actions for the next step
+    """
+    if name in players:
+        return players[name]
+    if ":" not in name:
+        raise ValueError("unknown player %r, use one of %s or module:attribute" % (name, ", ".join(players)))
+    module, attr = name.split(":", 1)
+    return getattr(importlib.import_module(module), attr)
+
+
+def runGame(player, seed, maxPieces=None):
+    """
+    runGame (player, seed, maxPieces): plays one game, one gravity tick per step\n
+    player : name passed to getPlayer\n
+    returns: dict of seed, score, lines, pieces, speedMult, finished and seconds
+    """
+    start = time.perf_counter()
+    engine = TetrisEngine(seed=seed)
+    score, lines, pieces = playOut(engine, getPlayer(player)(engine), maxPieces)
+
+    return {
+        "seed": seed,
+        "score": score,
+        "lines": lines,
+        "pieces": pieces,
+        "speedMult": speedFor(lines),
+        "finished": engine.games > 0,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def _runGame(args):
+    return runGame(*args)
+
+
+def runGames(player, games, seed=0, maxPieces=None, processes=None):
+    """
+    runGames (player, games, seed, maxPieces, processes): yields runGame results as games finish\n
+    only a few games per worker are queued at a time so any number of games runs in constant memory
+    """
+    jobs = ((player, seed + i, maxPieces) for i in range(games))
+    for i, result in runPool(_runGame, jobs, processes):
+        yield result
+
+
+class Stats (object):
+    """
+    Stats (): running totals of a stream of game results, nothing is kept per game\n
+    scores are also counted in power of two buckets for the distribution
+    """
+    def __init__(self):
+        self.games = 0
+        self.finished = 0
+        self.totals = {"score": 0, "lines": 0, "pieces": 0, "seconds": 0}
+        self.lows = {}
+        self.highs = {}
+        self.buckets = {}
+
+    def add(self, result):
+        self.games += 1
+        if result["finished"]:
+            self.finished += 1
+        for key in self.totals:
+            value = result[key]
+            self.totals[key] += value
+            self.lows[key] = min(self.lows.get(key, value), value)
+            self.highs[key] = max(self.highs.get(key, value), value)
+
+        bucket = 1 << max(result["score"], 1).bit_length() - 1
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def report(self, wall, processes):
+        """
+        report (wall, processes): returns the summary text for wall seconds of running on processes workers
+        """
+        n = max(self.games, 1)
+        lines = ["games: %d (%d topped out)" % (self.games, self.finished)]
+        for key in ["score", "lines", "pieces"]:
+            lines.append("%-7s mean %10.1f  min %8d  max %8d" % (key + ":", self.totals[key]/n, self.lows.get(key, 0), self.highs.get(key, 0)))
+
+        lines.append("score distribution:")
+        for bucket in sorted(self.buckets):
+            count = self.buckets[bucket]
+            lines.append("  %8d - %-8d %7d %s" % (bucket, bucket*2 - 1, count, "#"*int(50*count/n)))
+
+        pieces = self.totals["pieces"]
+        lines.append("throughput: %.2f games/s, %.0f pieces/s, %.0f pieces/s per core" % (
+            self.games/wall, pieces/wall, pieces/wall/processes))
+        return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run seeded headless tetris games in parallel")
+    parser.add_argument("--games", type=int, default=100, help="number of games")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game, game i uses seed+i")
+    parser.add_argument("--player", default="ai", help="%s or module:attribute" % ", ".join(players))
+    parser.add_argument("--max-pieces", type=int, default=None, help="stop each game after this many pieces")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--out", default=None, help="write every game result to this file as JSON lines")
+    parser.add_argument("--every", type=int, default=0, help="print progress every N games")
+    args = parser.parse_args(argv)
+
+    try:
+        getPlayer(args.player)
+    except (ValueError, ImportError, AttributeError) as e:
+        parser.error(str(e))
+    processes = args.processes or os.cpu_count() or 1
+
+    out = open(args.out, "w") if args.out else None
+    stats = Stats()
+    start = time.perf_counter()
+    try:
+        for result in runGames(args.player, args.games, args.seed, args.max_pieces, processes):
+            stats.add(result)
+            if out:
+                out.write(json.dumps(result) + "\n")
+            if args.every and stats.games % args.every == 0:
+                print("%d/%d games, %.1fs" % (stats.games, args.games, time.perf_counter() - start), file=sys.stderr)
+    finally:
+        if out:
+            out.close()
+
+    print(stats.report(time.perf_counter() - start, processes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Terminal frontend for hosts without a display, plays the same TetrisEngine as main.py with the keys from settings.txt
+
+    python terminal.py
+
+Every frame is compared with the last one and only the cells that changed are written, each run of them after
+one ANSI cursor move, so a frame where nothing moved costs nothing and a falling block costs a few dozen bytes.
+Ctrl-C or q (unless it is bound) quits.
+"""
+import ast
+import os
+import select
+import signal
+import sys
+import termios
+import time
+import tty
+
+from engine import TetrisEngine, Scheduler, ACTIONS
+from paths import find_data_file
+from leaderboard import Leaderboard
+
+#escape sequences of the keys that send more than one byte, by their pygame key name
+SEQUENCES = {
+    b"\x1b[A": "up", b"\x1b[B": "down", b"\x1b[C": "right", b"\x1b[D": "left",
+    b"\x1bOA": "up", b"\x1bOB": "down", b"\x1bOC": "right", b"\x1bOD": "left",
+}
+NAMES = {b" ": "space", b"\r": "return", b"\n": "return", b"\t": "tab", b"\x7f": "backspace", b"\x1b": "escape"}
+
+#(sgr, text) of every kind of cell, each cell is two columns wide
+EMPTY = ("", "  ")
+PLACED = ("\x1b[47m", "  ")
+ACTIVE = ("\x1b[107m", "  ")
+GHOST = ("\x1b[90m", "[]")
+WALL = ("\x1b[100m", "  ")
+
+
+def keyNames(data):
+    """
+    keyNames (data): returns the pygame key names of the keys in bytes read from a terminal
+    """
+    names = []
+    i = 0
+    while i < len(data):
+        for seq, name in SEQUENCES.items():
+            if data.startswith(seq, i):
+                names.append(name)
+                i += len(seq)
+                break
+        else:
+            c = data[i:i+1]
+            names.append(NAMES.get(c) or c.decode("latin-1").lower())
+            i += 1
+    return names
+
+
+class TermControls (object):
+    """
+    TermControls (settings, hold): turns key presses read from a terminal into game actions like Controls\n
+    terminals only report presses, so left and right repeat at the terminal's own rate instead of das/arr
+    and a key counts as held for hold ms after its last repeat, which is what keeps "speed" going
+    """
+    def __init__(self, settings, hold=150):
+        self.hold = hold
+        self.keymap = {}
+        for action in ACTIONS:
+            if action in settings:
+                self.keymap[settings[action]] = action
+        self.queue = []
+        self.held = {}
+
+    def handle(self, names, now):
+        """
+        handle (names): records key presses that arrived at now (ms)
+        """
+        for name in names:
+            action = self.keymap.get(name)
+            if action:
+                self.queue.append(action)
+                self.held[action] = now
+
+    def actions(self, now):
+        """
+        actions (now): returns every action pressed since the last call in order, then a held "speed"
+        """
+        out = [action for action in self.queue if action != "speed"]
+        self.queue = []
+        if "speed" in self.held and now - self.held["speed"] <= self.hold:
+            out.append("speed")
+        return out
+
+
+class TermRenderer (object):
+    """
+    TermRenderer (out): draws a game into a terminal with ANSI escapes, writing only what changed\n
+    out : file descriptor of the terminal\n
+    the board is rebuilt only when Board.version changes, the active block, ghost and panel are laid over a copy
+    """
+    def __init__(self, out):
+        self.out = out
+        self.last = None
+        self.grid = None
+        self.version = -1
+        self.stack = None
+
+    def invalidate(self):
+        """
+        invalidate (): forces a full redraw on the next frame, after the terminal was resized or scribbled on
+        """
+        self.last = None
+
+    def board(self, grid):
+        if grid is self.grid and grid.version == self.version:
+            return self.stack
+        self.grid = grid
+        self.version = grid.version
+        rows = [[WALL] + [PLACED if row >> x & 1 else EMPTY for x in range(grid.width)] + [WALL] for row in grid.rows]
+        rows.append([WALL]*(grid.width + 2))
+        self.stack = rows
+        return rows
+
+    def cells(self, engine, ghost, lines):
+        """
+        cells (engine, ghost, lines): returns the frame as rows of (sgr, text) cells\n
+        lines : text shown next to the board, one per row
+        """
+        rows = [list(row) for row in self.board(engine.grid)]
+        block = engine.block
+        bx, by = block.pos
+
+        if ghost:
+            gy = engine.landing()
+            for x,y in block.state.cells:
+                if 0 <= gy + y < engine.height:
+                    rows[gy + y][bx + x + 1] = GHOST
+        for x,y in block.state.cells:
+            if 0 <= by + y < engine.height:
+                rows[by + y][bx + x + 1] = ACTIVE
+
+        for y in range(len(rows)):
+            text = (" " + (lines[y] if y < len(lines) else "")).ljust(20)[:20]
+            rows[y] += [("", text[i:i+2]) for i in range(0, 20, 2)]
+        return rows
+
+    def draw(self, rows):
+        """
+        draw (rows): writes the cells that differ from the last frame, returns the number of bytes written
+        """
+        last = self.last
+        out = []
+        if last is None:
+            out.append("\x1b[0m\x1b[2J")
+        sgr = ""
+        for y, row in enumerate(rows):
+            old = last[y] if last is not None and y < len(last) else None
+            x = 0
+            while x < len(row):
+                if old is not None and x < len(old) and row[x] == old[x]:
+                    x += 1
+                    continue
+                out.append("\x1b[%d;%dH" % (y + 1, 2*x + 1))
+                #unchanged gaps of up to two cells are rewritten, that is shorter than moving the cursor again
+                while x < len(row):
+                    if old is not None and x < len(old) and row[x] == old[x]:
+                        gap = 1
+                        while gap <= 2 and x + gap < len(row) and x + gap < len(old) and row[x + gap] == old[x + gap]:
+                            gap += 1
+                        if gap > 2 or x + gap >= len(row):
+                            break
+                    cell = row[x]
+                    if cell[0] != sgr:
+                        out.append("\x1b[0m" + cell[0])
+                        sgr = cell[0]
+                    out.append(cell[1])
+                    x += 1
+        self.last = rows
+        if not out:
+            return 0
+        if sgr:
+            out.append("\x1b[0m")
+        data = "".join(out).encode()
+        os.write(self.out, data)
+        return len(data)
+
+
+def main():
+    with open(find_data_file("settings.txt")) as f:
+        settings = ast.literal_eval(f.read())
+
+    width = min(max(int(settings.get("width", 10)), 4), 255)
+    height = min(max(int(settings.get("height", 24)), 4), 255)
+    name = settings.get("name", "PLAYER")
+    leaderboard = Leaderboard(find_data_file("scores.db"))
+    best = [leaderboard.best(name)]
+
+    def onLoose(score):
+        leaderboard.add(name, score, engine.lastLines, engine.lastPieces)
+        best[0] = max(best[0], score)
+
+    engine = TetrisEngine(width, height, onLoose, bag=settings.get("bag", 0))
+    scheduler = Scheduler(settings.get("tickRate", 120))
+    controls = TermControls(settings)
+    renderer = TermRenderer(sys.stdout.fileno())
+    frame = 1/settings.get("fps", 60)
+    quitKey = "q" not in controls.keymap
+
+    stdin = sys.stdin.fileno()
+    saved = termios.tcgetattr(stdin)
+    signal.signal(signal.SIGWINCH, lambda *args: renderer.invalidate())
+    #alternate screen and no cursor, both undone on the way out
+    os.write(renderer.out, b"\x1b[?1049h\x1b[?25l")
+    tty.setcbreak(stdin)
+    try:
+        while True:
+            start = time.monotonic()
+            now = start*1000
+            while select.select([stdin], [], [], 0)[0]:
+                names = keyNames(os.read(stdin, 1024))
+                if quitKey and "q" in names:
+                    return 0
+                controls.handle(names, now)
+
+            steps = scheduler.advance(now)
+            if steps:
+                actions = controls.actions(now)
+                for i in range(steps):
+                    engine.step(actions, scheduler.dt)
+                    actions = ["speed"] if "speed" in actions else []
+
+            nextBlock = engine.nextBlock.state
+            lines = ["score %d" % engine.score, "lines %d" % engine.numLines, "best  %d" % best[0], "", "next"]
+            for y in range(nextBlock.size[1]):
+                lines.append("".join("[]" if (x,y) in nextBlock.cells else "  " for x in range(nextBlock.size[0])))
+            if engine.games:
+                lines += ["", "last  %d" % engine.lastScore]
+            renderer.draw(renderer.cells(engine, settings.get("ghost", 1), lines))
+
+            left = frame - (time.monotonic() - start)
+            if left > 0:
+                select.select([stdin], [], [], left)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        termios.tcsetattr(stdin, termios.TCSADRAIN, saved)
+        os.write(renderer.out, b"\x1b[0m\x1b[?25h\x1b[?1049l")
+        leaderboard.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())